@@ -1,36 +1,235 @@
 import requests
 import json
-# import time
 import os
+import time
 import datetime
 import logging
+import threading
+from functools import lru_cache
 import lark_oapi as lark
 from lark_oapi.api.bitable.v1 import *
 from pathlib import Path
 # import socket
-# from requests.adapters import HTTPAdapter
-# from urllib3.util.retry import Retry
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from cleaner import find_data_directory
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+# orjson is a lot faster than the stdlib codec, keep json as fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Logging is configured by the entry point (schedule_module / startup), not on import
 logger = logging.getLogger(__name__)
 
+# Lark SDK verbosity, DEBUG dumps every request/response so keep it quiet by default
+_LARK_LOG_LEVELS = {
+    "DEBUG": lark.LogLevel.DEBUG,
+    "INFO": lark.LogLevel.INFO,
+    "WARNING": lark.LogLevel.WARNING,
+    "ERROR": lark.LogLevel.ERROR,
+}
+LARK_LOG_LEVEL = _LARK_LOG_LEVELS.get(os.environ.get("LARK_LOG_LEVEL", "WARNING").upper(), lark.LogLevel.WARNING)
+
+# Shared session so Lark calls reuse the same keep-alive connections.
+# Retry only kicks in for idempotent methods, so POSTs are never replayed.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+REQUEST_TIMEOUT = 30
+# The token fetch runs under _TOKEN_LOCK and blocks every Lark caller, so it gets a shorter leash
+TOKEN_TIMEOUT = 10
+
+TENANT_TOKEN_URL = "https://open.larksuite.com/open-apis/auth/v3/tenant_access_token/internal/"
+
+# Tenant tokens live ~2h, cache them per app instead of fetching one per call
+_TOKEN_CACHE: dict[tuple[str, str], tuple[str, float]] = {}
+_TOKEN_LOCK = threading.Lock()
+INVALID_TOKEN_CODES = (99991663, 99991668)
+
+def _get_tenant_token(app_id: str, app_secret: str):
+    """Return a cached tenant_access_token, refreshing it when it is about to expire."""
+    key = (app_id, app_secret)
+    with _TOKEN_LOCK:
+        cached = _TOKEN_CACHE.get(key)
+        if cached and cached[1] - time.time() > 60:
+            return cached[0]
+
+        try:
+            token_response = _SESSION.post(TENANT_TOKEN_URL, json={
+                "app_id": app_id,
+                "app_secret": app_secret
+            }, timeout=TOKEN_TIMEOUT)
+            token_data = token_response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Failed to get tenant access token: {e}")
+            return None
+        tenant_token = token_data.get("tenant_access_token")
+        if not tenant_token:
+            logger.error(f"Failed to get tenant access token: {token_data}")
+            return None
+
+        _TOKEN_CACHE[key] = (tenant_token, time.time() + token_data.get("expire", 7200))
+        return tenant_token
+
+# Field mapping to match the Lark Base headers
+FIELD_MAPPING = {
+    "timestamp": "Timestamp",
+    "status": "Status",
+    "message": "Description",
+    "opening_balance": "Opening",
+    "closing_balance": "Closing",
+    "total_credit": "Credit",
+    "total_debit": "Debit",
+    "last_updated": "Updated"
+}
+
+# Subset of FIELD_MAPPING that is read from data["account_info"]
+_ACCOUNT_FIELD_MAPPING = {
+    key: FIELD_MAPPING[key]
+    for key in ("opening_balance", "closing_balance", "total_credit", "total_debit", "last_updated")
+}
+
+# Max records Lark accepts in a single batch_create call
+LARK_BATCH_SIZE = 500
+
+# Fields that require numeric conversion
+NUMERIC_FIELDS = frozenset(("Opening", "Closing", "Credit", "Debit"))
+
+class _NumericTranslateTable(dict):
+    """str.translate table that keeps ASCII digits and '.', deleting everything else.
+
+    Entries are filled lazily on first lookup, so non-ASCII noise such as
+    '\u00a0' or '₫' is dropped too without building a 0x110000 entry table.
+    """
+    _KEEP = frozenset(map(ord, '0123456789.'))
+
+    def __missing__(self, code):
+        value = code if code in self._KEEP else None
+        self[code] = value
+        return value
+
+_NUMERIC_TBL = _NumericTranslateTable()
+
+@lru_cache(maxsize=1024)
+def _parse_iso(timestamp_str: str) -> str:
+    """Convert an ISO / 'YYYY-MM-DD HH:MM:SS' timestamp to DD-MM-YYYY HH:MM:SS.
+
+    Cached because a batch of rows usually repeats the same few timestamps.
+    """
+    try:
+        # If it's in ISO format with 'T' separator
+        if 'T' in timestamp_str:
+            dt = datetime.datetime.fromisoformat(timestamp_str.split('.')[0])
+        # Any other format, try parsing and convert
+        elif '.' in timestamp_str:
+            dt = datetime.datetime.fromisoformat(timestamp_str)
+        else:
+            dt = datetime.datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
+        return dt.strftime('%d-%m-%Y %H:%M:%S')
+    except Exception:
+        # If parsing fails, return original
+        return timestamp_str
+
+# Format timestamp consistently - handle both formats:
+# 1. DD-MM-YYYY HH:MM:SS (from the fixed router)
+# 2. ISO format (in case it's present in some data)
+def format_timestamp(timestamp_str):
+    if not isinstance(timestamp_str, str):
+        return timestamp_str
+    # If it's already in DD-MM-YYYY HH:MM:SS format, return it
+    if len(timestamp_str) == 19 and timestamp_str[2] == '-' and timestamp_str[5] == '-':
+        return timestamp_str
+    return _parse_iso(timestamp_str)
+
+def _json_loads(raw: bytes):
+    # Both orjson and json accept bytes, so no utf-8 decode step is needed
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def _json_dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+@lru_cache(maxsize=8)
+def _lark_client(app_id: str, app_secret: str):
+    """Build the Lark SDK client once per app instead of on every push."""
+    return lark.Client.builder()\
+        .app_id(app_id)\
+        .app_secret(app_secret)\
+        .log_level(LARK_LOG_LEVEL)\
+        .build()
+
+# Marker for numeric values that must be left out of the record
+_SKIP = object()
+
+def _to_number(value):
+    """Convert an account_info amount for a Lark number field, or _SKIP it."""
+    # Skip "N/A" values for numeric fields to avoid NumberFieldConvFail errors
+    if value == "N/A":
+        return _SKIP
+    # If it's already a number, use it directly
+    if not isinstance(value, str):
+        return value
+    try:
+        # Remove non-numeric characters except decimal point
+        return float(value.translate(_NUMERIC_TBL))
+    except (ValueError, TypeError):
+        # If conversion fails, skip this field
+        return _SKIP
+
+def _map_records(items: list) -> list:
+    """Map transactions payloads to Lark Base fields, one column at a time.
+
+    Every column is gathered across all rows and converted in a single pass,
+    then scattered back into the per-row field dicts.
+    """
+    records = [{} for _ in items]
+    
+    # Map basic fields with timestamp formatting
+    rows = [i for i, item in enumerate(items) if "timestamp" in item]
+    for i, value in zip(rows, map(format_timestamp, [items[i]["timestamp"] for i in rows])):
+        records[i][FIELD_MAPPING["timestamp"]] = value
+    for key in ("status", "message"):
+        field_name = FIELD_MAPPING[key]
+        for record, item in zip(records, items):
+            if key in item:
+                record[field_name] = item[key]
+    
+    # Map account_info fields with numeric preprocessing
+    infos = [item.get("account_info") or {} for item in items]
+    for key, field_name in _ACCOUNT_FIELD_MAPPING.items():
+        rows = [i for i, info in enumerate(infos) if key in info]
+        column = [infos[i][key] for i in rows]
+        # Handle timestamp formatting for last_updated
+        if key == "last_updated":
+            column = [format_timestamp(value) for value in column]
+        # Numeric fields need conversion
+        elif field_name in NUMERIC_FIELDS:
+            column = list(map(_to_number, column))
+        for i, value in zip(rows, column):
+            if value is not _SKIP:
+                records[i][field_name] = value
+    
+    return records
+
 def push_to_Lark_Base(
     app_id: str,
     app_secret: str,
     json_path: str = None,
-    json_data: json = None,
+    json_data: dict | list = None,
     app_token: str = None,
     table_id: str = None
 ):
-    # Create client
-    client = lark.Client.builder()\
-        .app_id(app_id)\
-        .app_secret(app_secret)\
-        .log_level(lark.LogLevel.DEBUG)\
-        .build()
+    # Create client (cached per credentials)
+    client = _lark_client(app_id, app_secret)
     
     # Load JSON data either from file or from provided data
     data = None
@@ -40,146 +239,62 @@ def push_to_Lark_Base(
         # Use the Path object to handle the file path in a cross-platform way
         json_file_path = Path(json_path)
         
-        if json_file_path.exists():
-            logger.info(f"Loading JSON from file: {json_file_path}")
-            with open(json_file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-        else:
+        if not json_file_path.is_file():
             # Try to find the file in the data directory as fallback
             logger.warning(f"JSON file not found at: {json_file_path}")
-            data_dir = find_data_directory()
-            potential_file = data_dir / os.path.basename(json_path)
-            
-            if potential_file.exists():
-                logger.info(f"Found JSON file in data directory: {potential_file}")
-                with open(potential_file, 'r', encoding='utf-8') as file:
-                    data = json.load(file)
-            else:
+            json_file_path = find_data_directory() / os.path.basename(json_path)
+            if not json_file_path.is_file():
                 raise ValueError(f"Could not find JSON file: {json_path}")
+        
+        # Single read straight into the parser, orjson consumes the bytes as-is
+        logger.info(f"Loading JSON from file: {json_file_path}")
+        data = _json_loads(json_file_path.read_bytes())
     else:
         raise ValueError("Either json_data or a valid json_path must be provided")
     
-    # Define field mapping to match the Lark Base headers
-    field_mapping = {
-        "timestamp": "Timestamp",
-        "status": "Status",
-        "message": "Description",
-        "opening_balance": "Opening",
-        "closing_balance": "Closing",
-        "total_credit": "Credit",
-        "total_debit": "Debit",
-        "last_updated": "Updated"
-    }
-    
-    # Fields that require numeric conversion
-    numeric_fields = ["Opening", "Closing", "Credit", "Debit"]
-    
-    # Map fields according to the Lark Base headers
-    mapped_fields = {}
-    
-    # Format timestamp consistently - handle both formats:
-    # 1. DD-MM-YYYY HH:MM:SS (from the fixed router)
-    # 2. ISO format (in case it's present in some data)
-    def format_timestamp(timestamp_str):
-        try:
-            # If it's already in DD-MM-YYYY HH:MM:SS format, return it
-            if len(timestamp_str) == 19 and timestamp_str[2] == '-' and timestamp_str[5] == '-':
-                return timestamp_str
-                
-            # If it's in ISO format with 'T' separator
-            elif 'T' in timestamp_str:
-                dt = datetime.datetime.fromisoformat(timestamp_str.split('.')[0])
-                return dt.strftime('%d-%m-%Y %H:%M:%S')
-                
-            # Any other format, try parsing and convert
-            else:
-                dt = datetime.datetime.fromisoformat(timestamp_str) if '.' in timestamp_str else datetime.datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S')
-                return dt.strftime('%d-%m-%Y %H:%M:%S')
-        except Exception:
-            # If parsing fails, return original
-            return timestamp_str
-    
-    # Map basic fields with timestamp formatting
-    for key in ["timestamp", "status", "message"]:
-        if key in data and key in field_mapping:
-            if key == "timestamp":
-                mapped_fields[field_mapping[key]] = format_timestamp(data[key])
-            else:
-                mapped_fields[field_mapping[key]] = data[key]
-    
-    # Map account_info fields with numeric preprocessing
-    if "account_info" in data:
-        for key, value in data["account_info"].items():
-            if key in field_mapping:
-                field_name = field_mapping[key]
-                # Handle timestamp formatting for last_updated
-                if key == "last_updated" and isinstance(value, str):
-                    mapped_fields[field_name] = format_timestamp(value)
-                # Check if this is a numeric field that needs conversion
-                elif field_name in numeric_fields:
-                    # Skip "N/A" values for numeric fields to avoid conversion errors
-                    if value == "N/A":
-                        # Exclude this field from the mapped fields to prevent NumberFieldConvFail error
-                        continue
-                    
-                    # Handle string numeric values
-                    if isinstance(value, str):
-                        try:
-                            # Remove non-numeric characters except decimal point
-                            cleaned_value = ''.join(c for c in value if c.isdigit() or c == '.')
-                            # Convert to float
-                            mapped_fields[field_name] = float(cleaned_value)
-                        except (ValueError, TypeError):
-                            # If conversion fails, skip this field
-                            continue
-                    else:
-                        # If it's already a number, use it directly
-                        mapped_fields[field_name] = value
-                else:
-                    mapped_fields[field_name] = value
+    # A single payload or a list of payloads can be pushed in one go
+    items = data if isinstance(data, list) else [data]
+    records = [AppTableRecord.builder().fields(fields).build() for fields in _map_records(items)]
     
-    # Construct request object with mapped fields
-    request = BatchCreateAppTableRecordRequest.builder() \
-        .app_token(app_token) \
-        .table_id(table_id) \
-        .request_body(BatchCreateAppTableRecordRequestBody.builder()
-            .records([AppTableRecord.builder()
-                .fields(mapped_fields)
-                .build()
-            ])
-            .build()) \
-        .build()
-    # Send request to Lark Base
-    response = client.bitable.v1.app_table_record.batch_create(request)
-    
-    # Handle response
-    if not response.success():
-        error_msg = f"Failed to push data to Lark Base, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}"
-        print(error_msg)
-        return {
-            "status": "false", 
-            "message": error_msg
-        }
+    # Lark accepts up to LARK_BATCH_SIZE records per batch_create call
+    batch_results = []
+    for i in range(0, len(records), LARK_BATCH_SIZE):
+        batch = records[i:i + LARK_BATCH_SIZE]
+        # Construct request object with mapped fields
+        request = BatchCreateAppTableRecordRequest.builder() \
+            .app_token(app_token) \
+            .table_id(table_id) \
+            .request_body(BatchCreateAppTableRecordRequestBody.builder()
+                .records(batch)
+                .build()) \
+            .build()
+        # Send request to Lark Base
+        response = client.bitable.v1.app_table_record.batch_create(request)
+        
+        # Handle response
+        if not response.success():
+            error_msg = f"Failed to push data to Lark Base, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}"
+            if i:
+                error_msg += f" ({i}/{len(records)} records were already pushed)"
+            print(error_msg)
+            return {
+                "status": "false", 
+                "message": error_msg
+            }
+        batch_results.append(response.data)
     
-    return {"status": "success", "message": "Successfully pushed data to Lark Base", "data": response.data}
+    return {
+        "status": "success",
+        "message": "Successfully pushed data to Lark Base",
+        "data": batch_results[0] if len(batch_results) == 1 else batch_results
+    }
 
 def list_all_chats(app_id, app_secret):
     # Get tenant access token
-    token_url = "https://open.larksuite.com/open-apis/auth/v3/tenant_access_token/internal/"
-    token_payload = {
-        "app_id": app_id,
-        "app_secret": app_secret
-    }
-    
-    token_response = requests.post(token_url, json=token_payload)
-    token_data = token_response.json()
-    
-    if "tenant_access_token" not in token_data:
-        print(f"Failed to get tenant access token: {token_data}")
+    tenant_token = _get_tenant_token(app_id, app_secret)
+    if not tenant_token:
         return []
     
-    tenant_token = token_data["tenant_access_token"]
-    
     # List all chats with pagination
     chat_url = "https://open.larksuite.com/open-apis/im/v1/chats"
     headers = {
@@ -190,20 +305,30 @@ def list_all_chats(app_id, app_secret):
     next_page_token = None
     
     while True:
-        params = {"page_token": next_page_token} if next_page_token else {}
-        chat_response = requests.get(chat_url, headers=headers, params=params)
+        # Ask for the largest page Lark allows to keep the round trips down
+        params = {"page_size": 100}
+        if next_page_token:
+            params["page_token"] = next_page_token
+        chat_response = _SESSION.get(chat_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+        try:
+            body = chat_response.json()
+        except ValueError:
+            body = {}
+        if body.get("code") in INVALID_TOKEN_CODES:
+            # Token was revoked before its expiry, fetch a fresh one next time
+            _TOKEN_CACHE.pop((app_id, app_secret), None)
 
         if chat_response.status_code == 200:
-            data = chat_response.json()
-            for chat in data.get("data", {}).get("items", []):
-                chat_name = chat.get('name', 'No Name Available')
-                chat_id = chat.get('chat_id', 'No Chat ID Available')
-                all_chats.append({
-                    'name': chat_name,
-                    'chat_id': chat_id
-                })
+            data = body.get("data", {})
+            all_chats.extend(
+                {
+                    'name': chat.get('name', 'No Name Available'),
+                    'chat_id': chat.get('chat_id', 'No Chat ID Available')
+                }
+                for chat in data.get("items", ())
+            )
             
-            next_page_token = data.get("data", {}).get("page_token", None)
+            next_page_token = data.get("page_token", None)
             
             if not next_page_token:
                 break
@@ -224,24 +349,18 @@ def find_chat_id_by_name(app_id, app_secret, chat_name):
         "partial_matches": []
     }
     
-    # Perform case-insensitive search for exact match
+    # Case-insensitive exact and partial matching in a single pass
+    target = chat_name.lower()
     for chat in all_chats:
-        if chat["name"].lower() == chat_name.lower():
+        lname = chat["name"].lower()
+        if lname == target and result["exact_match"] is None:
             result["status"] = "success"
             result["message"] = f"Found exact match for '{chat_name}'"
             result["exact_match"] = {
                 "name": chat["name"],
                 "chat_id": chat["chat_id"]
             }
-            break
-    
-    # Look for partial matches
-    for chat in all_chats:
-        if chat_name.lower() in chat["name"].lower():
-            # Don't add the exact match again
-            if result["exact_match"] and chat["chat_id"] == result["exact_match"]["chat_id"]:
-                continue
-                
+        elif target in lname:
             result["partial_matches"].append({
                 "name": chat["name"],
                 "chat_id": chat["chat_id"]
@@ -260,19 +379,9 @@ def push_to_Lark_Channel(
     chat_id: str,  # receive id
     content: str
 ):
-    import requests
-    import json
-
     # Get tenant access token
-    token_url = "https://open.larksuite.com/open-apis/auth/v3/tenant_access_token/internal/"
-    token_payload = {
-        "app_id": app_id,
-        "app_secret": app_secret
-    }
-    token_response = requests.post(token_url, json=token_payload)
-    tenant_access_token = token_response.json().get("tenant_access_token")
+    tenant_access_token = _get_tenant_token(app_id, app_secret)
     if not tenant_access_token:
-        logger.error("Failed to get tenant access token")
         return {"status": "false", "message": "Failed to get tenant access token"}
     
     # Prepare the message payload
@@ -283,7 +392,7 @@ def push_to_Lark_Channel(
     }
     
     # Ensure content is properly formatted as a JSON string
-    formatted_content = json.dumps({"text": content})
+    formatted_content = _json_dumps({"text": content})
     
     payload = {
         "receive_id": chat_id,
@@ -296,14 +405,19 @@ def push_to_Lark_Channel(
     }
     
     # Send the message
-    response = requests.post(
+    response = _SESSION.post(
         message_url,
         headers=headers,
         params=params,
-        json=payload
+        json=payload,
+        timeout=REQUEST_TIMEOUT
     )
     
-    return response.json()
+    result = response.json()
+    if result.get("code") in INVALID_TOKEN_CODES:
+        # Token was revoked before its expiry, fetch a fresh one next time
+        _TOKEN_CACHE.pop((app_id, app_secret), None)
+    return result
 
 '''
 --- functions to make API interaction with Woo-commerce ---
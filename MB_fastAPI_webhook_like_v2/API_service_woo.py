@@ -5,28 +5,47 @@
 import requests
 import logging
 from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from concurrent.futures import ThreadPoolExecutor
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-
+# Logging is configured by the entry point (schedule_module / startup), not on import
 logger = logging.getLogger("API_service_woo")
 
+# Shared session so WooCommerce calls reuse the same keep-alive connections.
+# Retry only kicks in for idempotent methods, so order creation is never replayed.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=20,
+    pool_maxsize=50,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+))
+REQUEST_TIMEOUT = 30
+
+# Long-lived workers for the confirm/webhook legs, shared across transactions
+_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="woo")
+
+# Strip thousands separators from amounts like "1,500,000", whitespace goes in _clean_amount
+_AMOUNT_TBL = str.maketrans('', '', ',')
+_CENTS = Decimal('0.01')
+
+def _clean_amount(raw: str) -> str:
+    """Drop every kind of whitespace (tabs, newlines, NBSP from the scraped cell) and the separators"""
+    return ''.join(raw.split()).translate(_AMOUNT_TBL)
+
+# Pattern: GH followed by exactly 6 digits, where GH is at the start or preceded by ., ,, -, or space
+_WOO_ORDER_RE = re.compile(r'(?:^|[\s.,\-])(GH\d{6})')
+
 def detect_woo_order(description: str):
     if not description:
         return None
     
-    # Pattern: GH followed by exactly 6 digits, where GH is at the start or preceded by ., ,, -, or space
-    pattern = r'(?:^|[\s.,\-])(GH\d{6})'
-    match = re.search(pattern, description)
-    
-    if match:
-        return match.group(1)  # Return just the GH + 6 digits part
-    else:
-        return None
+    # Return just the GH + 6 digits part
+    match = _WOO_ORDER_RE.search(description)
+    return match.group(1) if match else None
 
 def create_woocommerce_order(
     url: str,
@@ -42,12 +61,15 @@ def create_woocommerce_order(
     """
     # Extract fields
     customer_name = data.get("ĐƠN VỊ THỤ HƯỞNG/ĐƠN VỊ CHUYỂN", "Unknown").strip()
-    amount_str = data.get("PHÁT SINH CÓ", "0").replace(",", "").strip()
+    amount_str = _clean_amount(data.get("PHÁT SINH CÓ", "0"))
 
+    # Decimal keeps the dong amount exact, no float round-trip
     try:
-        total = float(amount_str)
-    except ValueError:
-        total = 0.0
+        total = Decimal(amount_str) if amount_str else Decimal(0)
+    except InvalidOperation:
+        total = Decimal(0)
+    if not total.is_finite():
+        total = Decimal(0)
 
     # Build WooCommerce order payload
     payload = {
@@ -60,17 +82,18 @@ def create_woocommerce_order(
         "fee_lines": [
             {
                 "name": "Bank Transaction",
-                "total": f"{total:.2f}"
+                "total": str(total.quantize(_CENTS))
             }
         ]
     }
 
     # Send to WooCommerce
     endpoint = f"{url.rstrip('/')}/wp-json/wc/v3/orders"
-    response = requests.post(
+    response = _SESSION.post(
         endpoint,
         auth=HTTPBasicAuth(consumer_key, consumer_secret),
-        json=payload
+        json=payload,
+        timeout=REQUEST_TIMEOUT
     )
 
     response.raise_for_status()
@@ -82,9 +105,10 @@ def list_orders(
     customer_key: str,
     customer_secret:str
 ):
-    response = requests.get(
+    response = _SESSION.get(
         f"{url}/wp-json/wc/v3/orders",
-        auth=HTTPBasicAuth(customer_key, customer_secret)
+        auth=HTTPBasicAuth(customer_key, customer_secret),
+        timeout=REQUEST_TIMEOUT
     )
     return response.json()
 
@@ -96,19 +120,32 @@ def send_transaction_to_woo(
     subAccId: str = '839689988'
 ):
     # Parse amount
-    amount_str = transaction_data.get("PHÁT SINH CÓ", "").strip().replace(',', '')
+    amount_str = _clean_amount(transaction_data.get("PHÁT SINH CÓ", ""))
     try:
-        amount = float(amount_str) if amount_str else 0.0
-    except ValueError:
+        amount = Decimal(amount_str) if amount_str else Decimal(0)
+    except InvalidOperation:
         # amount = 0.0
         return {"error": "Invalid amount format in transaction data."}
+    if not amount.is_finite():
+        return {"error": "Invalid amount format in transaction data."}
+    # VND has no fractional part, send a plain int unless the bank says otherwise,
+    # then the exact decimal string (a float would round it)
+    amount = int(amount) if amount == amount.to_integral_value() else str(amount)
 
     # Parse date
     date_str = transaction_data.get("NGÀY GIAO DỊCH", "")
+    # Fixed-width DD/MM/YYYY HH:MM:SS, slice it instead of going through strptime;
+    # datetime() still rejects impossible dates like 31/02
     try:
-        date_obj = datetime.strptime(date_str, "%d/%m/%Y %H:%M:%S")
-        formatted_date = date_obj.strftime("%Y-%m-%d %H:%M:%S")
-    except ValueError:
+        if (len(date_str) != 19 or date_str[2] != "/" or date_str[5] != "/"
+                or date_str[10] != " " or date_str[13] != ":" or date_str[16] != ":"):
+            raise ValueError(date_str)
+        parsed = datetime(
+            int(date_str[6:10]), int(date_str[3:5]), int(date_str[0:2]),
+            int(date_str[11:13]), int(date_str[14:16]), int(date_str[17:19])
+        )
+        formatted_date = f"{parsed:%Y-%m-%d %H:%M:%S}"
+    except (ValueError, TypeError, IndexError):
         return {"error": "Invalid date format in transaction data."}
     
     # build payload
@@ -125,13 +162,14 @@ def send_transaction_to_woo(
     }
 
     # Send request
-    response = requests.post(
+    response = _SESSION.post(
         url=url,
         headers={
             "Secure-Token": secure_token,
             "Content-Type": "application/json"
         },
-        json=payload
+        json=payload,
+        timeout=REQUEST_TIMEOUT
     )
     
     return response.json()
@@ -163,11 +201,12 @@ def create_order(
         return {"error": "No line items provided for the order."}
     
     endpoint = f'{url}/wp-json/wc/v3/orders'
-    response = requests.post(
+    response = _SESSION.post(
         endpoint,
         auth=HTTPBasicAuth(customer_key, customer_secret),
         headers={'Content-Type': 'application/json'},
-        json=payload
+        json=payload,
+        timeout=REQUEST_TIMEOUT
     )
     
     return response.json()
@@ -181,11 +220,12 @@ def update_order(
     order_data: dict
 ):
     endpoint = f'{url}/wp-json/wc/v3/orders/{order_id}'
-    response = requests.put(
+    response = _SESSION.put(
         endpoint,
         auth=HTTPBasicAuth(customer_key, customer_secret),
         headers={'Content-Type': 'application/json'},
-        json=order_data
+        json=order_data,
+        timeout=REQUEST_TIMEOUT
     )
     return response.json()
 
@@ -197,11 +237,12 @@ def confirm_order(
     order_id: str
 ):
     endpoint = f'{url}/wp-json/wc/v3/orders/{order_id}'
-    response = requests.post(
+    response = _SESSION.post(
         endpoint,
         auth=HTTPBasicAuth(customer_key, customer_secret),
         headers={'Content-Type': 'application/json'},
-        json={"status": "completed"}
+        json={"status": "completed"},
+        timeout=REQUEST_TIMEOUT
     )
     return response.json()
 
@@ -298,14 +339,28 @@ def process_woo_transaction(
                 "woo_order_created": False
             }
         
-        # ✅ STEP 3: Confirm/Complete the order (testing purpose)
-        try:
-            confirm_result = confirm_order(
-                url=url,
-                customer_key=consumer_key,
-                customer_secret=consumer_secret,
-                order_id=str(woo_order_id)
+        # ✅ STEP 3 + OPTIONAL webhook: both only need the order id, so run them side by side
+        confirm_future = _EXECUTOR.submit(
+            confirm_order,
+            url=url,
+            customer_key=consumer_key,
+            customer_secret=consumer_secret,
+            order_id=str(woo_order_id)
+        )
+        webhook_future = None
+        if secure_token and detected_order_id:
+            webhook_future = _EXECUTOR.submit(
+                send_transaction_to_woo,
+                url=url,  # Webhook URL (might be different from WooCommerce URL)
+                secure_token=secure_token,
+                transaction_data=transaction_data,
+                order_id=detected_order_id,
+                subAccId='839689988'
             )
+
+        # Confirm/Complete the order (testing purpose)
+        try:
+            confirm_result = confirm_future.result(timeout=REQUEST_TIMEOUT)
             
             # Check if confirmation was successful
             if isinstance(confirm_result, dict) and confirm_result.get("id") == woo_order_id:
@@ -326,17 +381,11 @@ def process_woo_transaction(
             order_confirmed = False
             confirm_message = f"Unexpected confirmation error: {str(e)}"
         
-        # ✅ OPTIONAL: Send transaction to webhook (if secure_token provided)
+        # Send transaction to webhook (if secure_token provided)
         webhook_result = None
-        if secure_token and detected_order_id:
+        if webhook_future is not None:
             try:
-                webhook_result = send_transaction_to_woo(
-                    url=url,  # Webhook URL (might be different from WooCommerce URL)
-                    secure_token=secure_token,
-                    transaction_data=transaction_data,
-                    order_id=detected_order_id,
-                    subAccId='839689988'
-                )
+                webhook_result = webhook_future.result(timeout=REQUEST_TIMEOUT)
                 # logger.info(f"📡 Webhook notification sent for order {detected_order_id}")
             except Exception as e:
                 # logger.error(f"❌ Failed to send webhook notification: {e}")
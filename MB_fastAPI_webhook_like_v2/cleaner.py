@@ -2,28 +2,30 @@ import os
 import logging
 import datetime
 from pathlib import Path
-import glob
+import re
+import fnmatch
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
 
 # Enhanced function to find data directory
+# The directory does not move while the process runs, so probe the filesystem once
+@lru_cache(maxsize=1)
 def find_data_directory():
     """Find the data directory using multiple approaches to handle both Docker and Mac environments."""
     logger.info("Searching for data directory...")
     
     # Use environment variable if set (from Docker)
     env_data_dir = os.environ.get("DATA_DIR")
-    if env_data_dir and os.path.exists(env_data_dir):
+    if env_data_dir and Path(env_data_dir).is_dir():
         logger.info(f"Using data directory from environment: {env_data_dir}")
         return Path(env_data_dir)
     
     # Try multiple possible locations
     possible_paths = [
-        Path('./data'),                          # Current directory (run.py location)
-        Path('data'),                            # Current directory (alternative)
-        Path('./MB_fastAPI/data'),               # Relative to project root for Mac
-        Path('MB_fastAPI/data'),                 # Alternative Mac path
+        Path('data'),                            # Current directory (run.py location)
+        Path('MB_fastAPI/data'),                 # Relative to project root for Mac
         Path(os.path.dirname(__file__)) / 'data',  # Script directory
         # Removed /app/data which doesn't work on Mac
     ]
@@ -32,7 +34,7 @@ def find_data_directory():
     for path in possible_paths:
         try:
             logger.info(f"Checking path: {path.absolute()}")
-            if path.exists() and path.is_dir():
+            if path.is_dir():
                 logger.info(f"Found existing data directory: {path.absolute()}")
                 return path
         except Exception as e:
@@ -90,18 +92,23 @@ def find_data_directory():
 #         logger.error(f"Error cleaning up JSON files: {e}")
 
 def cleanup_data_directory(file_patterns=["mb_biz_transactions_*.json"], except_files=None):
-    if except_files is None:
-        except_files = []
+    # Absolute paths in a set so the exclusion check is O(1) per entry
+    except_set = {os.path.abspath(p) for p in (except_files or ())}
+    patterns = [re.compile(fnmatch.translate(p)) for p in file_patterns]
         
     try:
         data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+        if not os.path.isdir(data_dir):
+            return 0
         
-        # Find files to delete
-        json_files = []
-        for pattern in file_patterns:
-            json_files.extend(glob.glob(os.path.join(data_dir, pattern)))
-            
-        files_to_delete = [f for f in json_files if f not in except_files]
+        # Find files to delete, a single scandir pass instead of one glob per pattern
+        files_to_delete = []
+        with os.scandir(data_dir) as entries:
+            for entry in entries:
+                if (entry.is_file(follow_symlinks=False)
+                        and any(p.match(entry.name) for p in patterns)
+                        and entry.path not in except_set):
+                    files_to_delete.append(entry.path)
         
         if not files_to_delete:
             return 0
@@ -110,7 +117,7 @@ def cleanup_data_directory(file_patterns=["mb_biz_transactions_*.json"], except_
         deleted_count = 0
         for file_path in files_to_delete:
             try:
-                os.remove(file_path)
+                os.unlink(file_path)
                 deleted_count += 1
             except Exception as e:
                 logger.warning(f"Failed to delete {os.path.basename(file_path)}: {e}")
@@ -120,4 +127,4 @@ def cleanup_data_directory(file_patterns=["mb_biz_transactions_*.json"], except_
         
     except Exception as e:
         logger.error(f"Cleanup error: {e}")
-        return 0
\ No newline at end of file
+        return 0
@@ -1,130 +1,527 @@
 """
 Selenium WebDriver setup and management module.
-Provides a global WebDriver instance and dependency injection for FastAPI.
+Keeps a bounded pool of pre-warmed WebDriver sessions and provides
+checkout/checkin helpers.
 """
+import os
+import json
+import time
+import queue
+import socket
 import logging
+import threading
+import urllib3
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.edge.remote_connection import EdgeRemoteConnection
 # from selenium.webdriver.edge.options import Options
-from fastapi import Depends
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Global WebDriver instance
-driver = None
+# Number of Remote sessions kept warm, each one holds a browser slot on the grid node
+POOL_SIZE = int(os.getenv("MB_DRIVER_POOL_SIZE", "1"))
+# Seconds a caller waits for a free session before giving up
+CHECKOUT_TIMEOUT = float(os.getenv("MB_DRIVER_CHECKOUT_TIMEOUT", "60"))
+
+# Block heavy static assets (fonts, media, trackers) in every session, set to 0 to debug.
+# Images stay allowed, the captcha is read from a loaded <img> (screenshot or canvas redraw)
+BLOCK_ASSETS = os.getenv("MB_BLOCK_ASSETS", "1") == "1"
+BLOCKED_URL_PATTERNS = [
+    "*.woff", "*.woff2", "*.ttf",
+    "*.mp4", "*.webm",
+    "*google-analytics*", "*googletagmanager*", "*doubleclick*", "*facebook.net*"
+]
+
+# Read timeout for hub commands, new-session requests can sit in the grid queue for a while
+HUB_READ_TIMEOUT = float(os.getenv("MB_HUB_READ_TIMEOUT", "180"))
+# Keep-alive sockets kept open to the hub, below the number of concurrent commands
+# urllib3 drops the extras ("connection pool is full") and every command pays a new handshake
+HUB_HTTP_MAXSIZE = max(int(os.getenv("MB_HUB_HTTP_MAXSIZE", "20")), POOL_SIZE * 4)
+
+# Recycle a session after this many checkouts or seconds, browsers leak over long runs
+MAX_USES = int(os.getenv("MB_DRIVER_MAX_USES", "500"))
+MAX_AGE_S = int(os.getenv("MB_DRIVER_MAX_AGE_S", "3600"))
+# Every HEAP_CHECK_EVERY checkins also look at the JS heap (0 disables the check)
+HEAP_CHECK_EVERY = int(os.getenv("MB_DRIVER_HEAP_CHECK_EVERY", "25"))
+MAX_HEAP_MB = int(os.getenv("MB_DRIVER_MAX_HEAP_MB", "512"))
+
+@dataclass
+class PooledDriver:
+    """A pooled Remote session plus the bookkeeping used to probe and recycle it"""
+    driver: WebDriver
+    created_at: float = field(default_factory=time.monotonic)
+    uses: int = 0
+    last_checked: float = 0.0
+
+# Sessions probed within this many seconds are trusted without another round-trip
+PROBE_INTERVAL = 5
+# How long a /healthz answer is reused, so orchestrator polling can't flood the hub
+HEALTH_TTL = 1.0
+
+# In Docker environment, use the internal container name
+HUB_HOST = "selenium-hub-webhook"
+HUB_PORT = 4444
+
+# Resolved hub address, so new connections skip the Docker resolver
+_hub_ip = None
+
+def _forget_hub_ip():
+    """Drop the cached hub IP after a connection error, the hub may have moved."""
+    global _hub_ip
+    _hub_ip = None
 
 def get_selenium_hub_url():
     """Get the correct Selenium Hub URL based on environment"""
-    # In Docker environment, use the internal container name
-    return "http://selenium-hub-webhook:4444/wd/hub"
+    global _hub_ip
+    if _hub_ip is None:
+        try:
+            _hub_ip = socket.gethostbyname(HUB_HOST)
+        except OSError as e:
+            logger.warning(f"Could not resolve {HUB_HOST}, using the hostname: {e}")
+            return f"http://{HUB_HOST}:{HUB_PORT}/wd/hub"
+    return f"http://{_hub_ip}:{HUB_PORT}/wd/hub"
+
+# CRITICAL: Force desktop user agent (not mobile)
+DESKTOP_USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
+
+# Override any mobile detection, injected before each page's own scripts run
+DESKTOP_SHIM_JS = """
+    // Override mobile detection
+    Object.defineProperty(navigator, 'userAgent', {
+        get: function() { return '%s'; }
+    });
+
+    // Set desktop viewport
+    window.screen = {
+        width: 1920,
+        height: 1080,
+        availWidth: 1920,
+        availHeight: 1040
+    };
+
+    // Override touch capabilities
+    Object.defineProperty(navigator, 'maxTouchPoints', {
+        get: function() { return 0; }
+    });
+""" % DESKTOP_USER_AGENT
+
+# Retry policy for hub commands. Read errors and 5xx are only retried for GET/DELETE,
+# a POST (new session, click, ...) is only retried when the request never left
+_HUB_RETRY = urllib3.Retry(
+    total=3,
+    backoff_factor=0.2,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset(["GET", "DELETE"]),
+    raise_on_status=False
+)
+
+# One keep-alive socket pool to the hub shared by every session (and the liveness probe),
+# so idle sockets left by one driver are reused by the next instead of each owning its own
+_HUB_HTTP = urllib3.PoolManager(
+    timeout=urllib3.Timeout(connect=10, read=HUB_READ_TIMEOUT),
+    maxsize=HUB_HTTP_MAXSIZE,
+    block=False,
+    retries=_HUB_RETRY
+)
+
+class _HubConnection(EdgeRemoteConnection):
+    """Edge remote connection that talks to the hub through the shared _HUB_HTTP pool.
+
+    selenium 4.14 has no ClientConfig, so the pool is plugged in by overriding
+    the PoolManager factory instead.
+    """
+    def _get_connection_manager(self):
+        return _HUB_HTTP
+
+    def close(self):
+        # driver.quit() closes its connection, which would drop the sockets other sessions are using
+        pass
+
+def _execute_cdp(driver, cmd, params=None):
+    """Run a CDP command through the hub (Remote has no execute_cdp_cmd helper)."""
+    return driver.execute("executeCdpCommand", {"cmd": cmd, "params": params or {}})["value"]
 
-def setup_driver():
+def _build_options():
+    """Build the Edge options shared by every pooled session"""
+    options = webdriver.EdgeOptions()
+
+    # FORCE DESKTOP RENDERING - This is the key fix
+    options.add_argument("--window-size=1920,1080")  # Desktop resolution
+    options.add_argument("--disable-notifications")
+    options.add_argument("--headless")  # Run in headless mode
+
+    # CRITICAL: Force desktop user agent (not mobile)
+    options.add_argument(f"--user-agent={DESKTOP_USER_AGENT}")
+
+    # Force desktop viewport and disable mobile emulation
+    options.add_argument("--disable-mobile-emulation")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-blink-features=AutomationControlled")
+
+    # Force desktop rendering mode
+    options.add_argument("--force-device-scale-factor=1")
+    options.add_argument("--disable-features=VizDisplayCompositor")
+
+    # Set up capabilities with more detailed configuration
+    options.set_capability("browserName", "MicrosoftEdge")
+    options.set_capability("platformName", "linux")
+
+    # Add HTTP client configuration with higher timeouts
+    options.set_capability("se:options", {
+        "timeouts": {"implicit": 15000, "pageLoad": 30000, "script": 30000}
+    })
+    return options
+
+# Built once at import. Remote only reads options.to_capabilities(), which returns
+# a fresh dict, so the same object can safely back every session
+_OPTIONS_TEMPLATE = _build_options()
+
+def hub_ready():
+    """Quick GET /status on the hub, so an unreachable grid fails in seconds instead of a new-session timeout.
+
+    value.ready is deliberately ignored: the grid reports false whenever every node slot is
+    busy, and a new-session request should then queue on the hub instead of failing here.
+    Only a non-200 answer or a grid with no registered node counts as down.
+    """
+    try:
+        response = _HUB_HTTP.request("GET", f"{get_selenium_hub_url()}/status", timeout=2.0, retries=False)
+        if response.status != 200:
+            return False
+        nodes = json.loads(response.data).get("value", {}).get("nodes")
+        if nodes is not None and not nodes:
+            logger.warning("Selenium hub answers but has no node registered")
+            return False
+        return True
+    except Exception as e:
+        logger.warning("Selenium hub status check failed: %s", e)
+        _forget_hub_ip()
+        return False
+
+def setup_driver(options=None):
     """Create and configure a new Edge WebDriver instance"""
-    global driver
     try:
-        options = webdriver.EdgeOptions()
-        
-        # FORCE DESKTOP RENDERING - This is the key fix
-        options.add_argument("--window-size=1920,1080")  # Desktop resolution
-        options.add_argument("--start-maximized")
-        options.add_argument("--disable-notifications")
-        options.add_argument("--headless")  # Run in headless mode
-        
-        # CRITICAL: Force desktop user agent (not mobile)
-        desktop_user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0"
-        options.add_argument(f"--user-agent={desktop_user_agent}")
-        
-        # Force desktop viewport and disable mobile emulation
-        options.add_argument("--disable-mobile-emulation")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        
-        # Force desktop rendering mode
-        options.add_argument("--force-device-scale-factor=1")
-        options.add_argument("--disable-features=VizDisplayCompositor")
-        
-        # Set viewport size explicitly
-        options.add_experimental_option("mobileEmulation", {"deviceMetrics": {"width": 1920, "height": 1080, "pixelRatio": 1}})
-        
-        # Set up capabilities with more detailed configuration
-        options.set_capability("browserName", "MicrosoftEdge")
-        options.set_capability("platformName", "linux")
-        
-        # Add HTTP client configuration with higher timeouts
-        options.set_capability("se:options", {
-            "timeouts": {"implicit": 15000, "pageLoad": 30000, "script": 30000}
-        })
-        
+        if options is None:
+            options = _OPTIONS_TEMPLATE
+
+        if not hub_ready():
+            logger.error("Selenium hub is unreachable or has no node, not requesting a new session")
+            return None
+
         # Create a new WebDriver session
         driver = webdriver.Remote(
-            command_executor=get_selenium_hub_url(),
-            options=options,
-            keep_alive=True
+            command_executor=_HubConnection(get_selenium_hub_url(), keep_alive=True),
+            options=options
         )
-        
-        # FORCE DESKTOP VIEWPORT AFTER DRIVER CREATION
-        driver.set_window_size(1920, 1080)
-        driver.maximize_window()
-        
-        # Execute JavaScript to override any mobile detection
-        driver.execute_script("""
-            // Override mobile detection
-            Object.defineProperty(navigator, 'userAgent', {
-                get: function() { return 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0'; }
-            });
-            
-            // Set desktop viewport
-            window.screen = {
-                width: 1920,
-                height: 1080,
-                availWidth: 1920,
-                availHeight: 1040
-            };
-            
-            // Override touch capabilities
-            Object.defineProperty(navigator, 'maxTouchPoints', {
-                get: function() { return 0; }
-            });
-        """)
-        
+
+        # Register the anti-mobile shim once, Chromium re-runs it before every document's own scripts
+        # and make sure no device-metrics override is left over from a mobile viewport
+        try:
+            _execute_cdp(driver, "Page.addScriptToEvaluateOnNewDocument", {"source": DESKTOP_SHIM_JS})
+            _execute_cdp(driver, "Emulation.clearDeviceMetricsOverride")
+        except Exception as e:
+            logger.warning("Could not register desktop shim via CDP: %s", e)
+
+        # The crawler only needs DOM/text plus the captcha image, so only fonts, media and trackers go
+        if BLOCK_ASSETS:
+            try:
+                _execute_cdp(driver, "Network.enable")
+                _execute_cdp(driver, "Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+            except Exception as e:
+                logger.warning("Could not block static assets via CDP: %s", e)
+
         logger.info("Created new WebDriver session with FORCED DESKTOP rendering")
-        logger.info(f"User Agent: {driver.execute_script('return navigator.userAgent;')}")
-        logger.info(f"Viewport: {driver.get_window_size()}")
-        
+
+        # What the page actually sees, in one round-trip and only when someone is reading debug logs
+        if logger.isEnabledFor(logging.DEBUG):
+            ua, width, height, touch_points = driver.execute_script(
+                "return [navigator.userAgent, window.innerWidth, window.innerHeight, navigator.maxTouchPoints];"
+            )
+            logger.debug("Session %s: UA=%s viewport=%sx%s touchPoints=%s", driver.session_id, ua, width, height, touch_points)
+
         return driver
     except Exception as e:
-        logger.error(f"Error setting up WebDriver: {e}")
+        logger.error("Error setting up WebDriver: %s", e)
+        _forget_hub_ip()
         return None
 
+def _new_entry():
+    """Create a session and wrap it for the pool, or None if the hub refused."""
+    driver = setup_driver()
+    return PooledDriver(driver) if driver else None
+
+def _timed_new_entry(index):
+    """_new_entry for the warm-up workers, logging how long each session took."""
+    started = time.monotonic()
+    entry = _new_entry()
+    logger.info("Pool session #%d %s in %.1fs", index + 1, "created" if entry else "FAILED", time.monotonic() - started)
+    return entry
+
+def _is_alive(entry):
+    """Check that the hub still knows the session, without waiting on the driver's long timeouts."""
+    now = time.monotonic()
+    if now - entry.last_checked < PROBE_INTERVAL:
+        return True
+    try:
+        response = _HUB_HTTP.request(
+            "GET",
+            f"{get_selenium_hub_url()}/session/{entry.driver.session_id}/window",
+            timeout=2.0,
+            retries=False
+        )
+        alive = response.status == 200
+    except Exception:
+        _forget_hub_ip()
+        alive = False
+    if alive:
+        entry.last_checked = now
+    return alive
+
+def _heap_used_mb(driver):
+    """Read the page's JS heap size through CDP Performance metrics."""
+    _execute_cdp(driver, "Performance.enable")
+    metrics = _execute_cdp(driver, "Performance.getMetrics")["metrics"]
+    heap = next((m["value"] for m in metrics if m["name"] == "JSHeapUsedSize"), 0)
+    return heap / (1024 * 1024)
+
+def _needs_recycle(entry):
+    """Browsers leak over long runs, retire sessions that are too old or too used."""
+    if entry.uses >= MAX_USES:
+        return f"{entry.uses} uses"
+    if time.monotonic() - entry.created_at > MAX_AGE_S:
+        return f"older than {MAX_AGE_S}s"
+    if HEAP_CHECK_EVERY and entry.uses % HEAP_CHECK_EVERY == 0:
+        try:
+            heap_mb = _heap_used_mb(entry.driver)
+            if heap_mb > MAX_HEAP_MB:
+                return f"JS heap at {heap_mb:.0f} MB"
+        except Exception as e:
+            logger.warning(f"Could not read JS heap size: {e}")
+    return None
+
+def _reset_session(driver):
+    """Wipe cookies and leave the page, so the next borrower never inherits a logged-in bank session."""
+    try:
+        try:
+            # Clears every domain, delete_all_cookies only reaches the current page's
+            _execute_cdp(driver, "Network.clearBrowserCookies")
+        except Exception:
+            driver.delete_all_cookies()
+        driver.get("about:blank")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not reset WebDriver session state: {e}")
+        return False
+
+class DriverPool:
+    """Bounded pool of pre-warmed Remote sessions.
+
+    checkout()/checkin() are blocking and meant for worker threads, async callers
+    run them through asyncio.to_thread.
+    """
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        # Idle sessions ready for checkout, every session the pool owns, and the ones lent out
+        self._idle = queue.Queue()
+        self._all = []
+        self._lent = {}  # id(driver) -> PooledDriver
+        # Re-entrant: a SIGTERM handler calling close() may interrupt this same thread inside warm()
+        self._lock = threading.RLock()
+        # Only one warm() at a time. Held across the hub handshakes, which _lock never is
+        self._warm_lock = threading.Lock()
+        # Bumped by close(), so a warm() that was mid-handshake drops what it created
+        self._generation = 0
+        # Last healthy() answer and when it was computed
+        self._health = (0.0, False)
+
+    def warm(self, wait=True):
+        """Create sessions until the pool holds `size` of them.
+
+        The handshakes run without _lock, so checkin/checkout/healthy never wait on the hub.
+        With wait=False the call returns straight away if another thread is already warming.
+        """
+        if not self._warm_lock.acquire(blocking=wait):
+            return
+        try:
+            with self._lock:
+                missing = self.size - len(self._all)
+                generation = self._generation
+            if missing <= 0:
+                return
+            logger.info(f"Warming WebDriver pool: creating {missing} session(s) in parallel...")
+            started = time.monotonic()
+            # Each new session is a slow hub handshake, so request them all at once
+            with ThreadPoolExecutor(max_workers=missing) as executor:
+                entries = [entry for entry in executor.map(_timed_new_entry, range(missing)) if entry]
+            extra = []
+            with self._lock:
+                for entry in entries:
+                    # close() ran meanwhile, or _replace() already refilled the slot
+                    if generation != self._generation or len(self._all) >= self.size:
+                        extra.append(entry)
+                        continue
+                    self._all.append(entry)
+                    self._idle.put_nowait(entry)
+                ready = len(self._all)
+            for entry in extra:
+                try:
+                    entry.driver.quit()
+                except Exception:
+                    pass
+            logger.info(f"WebDriver pool ready: {ready}/{self.size} session(s) in {time.monotonic() - started:.1f}s")
+        finally:
+            self._warm_lock.release()
+
+    def _replace(self, entry, reason):
+        """Quit a pooled session and swap a fresh one into the pool in its place."""
+        logger.warning(f"Recycling WebDriver session {entry.driver.session_id} ({reason})...")
+        try:
+            entry.driver.quit()
+        except Exception:
+            pass
+        with self._lock:
+            if entry in self._all:
+                self._all.remove(entry)
+        new_entry = _new_entry()
+        if new_entry:
+            with self._lock:
+                self._all.append(new_entry)
+        return new_entry
+
+    def checkout(self, timeout=CHECKOUT_TIMEOUT):
+        """Check a session out of the pool, waiting up to `timeout` seconds for one."""
+        # A failed _replace() leaves a slot empty, refill it instead of running short forever.
+        # Only an empty pool has to wait for a warm-up another thread already started
+        if len(self._all) < self.size:
+            self.warm(wait=not self._all)
+        if not self._all:
+            logger.error("WebDriver pool is empty, no session could be created!")
+            return None
+        try:
+            entry = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            logger.error(f"No WebDriver session became free within {timeout}s")
+            return None
+        if not _is_alive(entry):
+            entry = self._replace(entry, "dead session")
+            if entry is None:
+                return None
+        with self._lock:
+            self._lent[id(entry.driver)] = entry
+        return entry.driver
+
+    def _give_back(self, entry, reason):
+        """Put a no longer lent session back on the idle queue, or a fresh one if `reason` says it is worn out."""
+        if not reason and not _reset_session(entry.driver):
+            reason = "state reset failed"
+        if reason:
+            entry = self._replace(entry, reason)
+        if entry is not None:
+            self._idle.put_nowait(entry)
+
+    def checkin(self, driver):
+        """Return a checked-out session to the pool, recycling it if it is worn out."""
+        with self._lock:
+            entry = self._lent.pop(id(driver), None)
+        if entry is None:
+            return
+        entry.uses += 1
+        self._give_back(entry, _needs_recycle(entry))
+
+    def keep(self, driver):
+        """Count one use of a session the caller keeps checked out (e.g. parked while logged in).
+
+        True if it may stay out. False once it is worn out, it is then recycled back
+        into the pool the same way checkin() would, and the caller must drop it.
+        """
+        with self._lock:
+            entry = self._lent.get(id(driver))
+        if entry is None:
+            return False
+        entry.uses += 1
+        reason = _needs_recycle(entry)
+        if not reason:
+            return True
+        with self._lock:
+            self._lent.pop(id(driver), None)
+        self._give_back(entry, reason)
+        return False
+
+    def revive(self, driver):
+        """Make sure a session kept checked out is still alive and not worn out, replacing it if not."""
+        with self._lock:
+            entry = self._lent.get(id(driver))
+        if entry is None:
+            return driver
+        reason = "dead session" if not _is_alive(entry) else _needs_recycle(entry)
+        if not reason:
+            return driver
+        with self._lock:
+            self._lent.pop(id(driver), None)
+        entry = self._replace(entry, reason)
+        if entry is None:
+            return None
+        with self._lock:
+            self._lent[id(entry.driver)] = entry
+        return entry.driver
+
+    def healthy(self):
+        """True if at least one pooled session still answers the hub, cached for HEALTH_TTL seconds."""
+        checked_at, ok = self._health
+        now = time.monotonic()
+        if now - checked_at < HEALTH_TTL:
+            return ok
+        with self._lock:
+            entries = list(self._all)
+        ok = any(_is_alive(entry) for entry in entries)
+        self._health = (now, ok)
+        return ok
+
+    def close(self):
+        """Quit every session, idle or lent out, so no browser outlives the process."""
+        with self._lock:
+            self._generation += 1
+            if self._all:
+                logger.info(f"Closing {len(self._all)} WebDriver session(s) on application shutdown...")
+            for entry in self._all:
+                try:
+                    entry.driver.quit()
+                except Exception as e:
+                    logger.error(f"Error closing WebDriver: {e}")
+            self._all.clear()
+            self._lent.clear()
+            # Drop the (now dead) idle sessions as well
+            while True:
+                try:
+                    self._idle.get_nowait()
+                except queue.Empty:
+                    break
+
+# Pool shared by the API (app.state.driver_pool) and the scheduler helpers below
+default_pool = DriverPool()
+
+# Session handed out by init_driver() (the scheduler keeps it checked out)
+_primary = None
+
 def init_driver():
-    """Initialize the global WebDriver instance."""
-    global driver
-    if driver is None:
+    """Warm up the pool and check out the session used by the caller."""
+    global _primary
+    if _primary is not None:
+        _primary = default_pool.revive(_primary)
+    if _primary is None:
         logger.info("Initializing WebDriver on application startup...")
-        driver = setup_driver()
-        if driver:
+        _primary = default_pool.checkout()
+        if _primary:
             logger.info("WebDriver initialized successfully.")
         else:
             logger.error("Failed to initialize WebDriver!")
-    return driver
+    return _primary
 
 def close_driver():
-    """Close the global WebDriver instance."""
-    global driver
-    if driver:
-        logger.info("Closing WebDriver on application shutdown...")
-        try:
-            driver.quit()
-        except Exception as e:
-            logger.error(f"Error closing WebDriver: {e}")
-        finally:
-            driver = None
-
-def get_driver():
-    """Dependency function to provide the WebDriver instance to routes."""
-    global driver
-    if driver is None:
-        logger.warning("WebDriver not initialized! Attempting to initialize now.")
-        driver = init_driver()
-    return driver
+    """Quit every pooled WebDriver session."""
+    global _primary
+    default_pool.close()
+    _primary = None
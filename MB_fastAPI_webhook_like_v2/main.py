@@ -1,12 +1,53 @@
+import os
+import asyncio
+import logging
+import httpx
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+# uvicorn only configures its own loggers, set up the root once so module loggers follow LOG_LEVEL
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+import driver
 from routers import MB_crawl_router
 from routers import MB_biz_crawl_router
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Warm the WebDriver pool before serving and quit every session on shutdown,
+    # so container restarts don't leave orphan browsers on the grid node
+    pool = driver.default_pool
+    app.state.driver_pool = pool
+    # One keep-alive HTTP client for every outbound call made while serving requests
+    app.state.http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        timeout=30.0
+    )
+    await asyncio.to_thread(pool.warm)
+    yield
+    await app.state.http_client.aclose()
+    await asyncio.to_thread(pool.close)
+
+app = FastAPI(lifespan=lifespan)
 
 # app.include_router(MB_crawl_router.router, prefix="/MB_crawl", tags=["MB"])
 app.include_router(MB_biz_crawl_router.router, prefix="/MB_biz_crawl", tags=["MB"])
 
 @app.get("/")
 def read_root():
-    return {"message": "[GOHUB] - [HOAIBAO] - MBBANK FASTAPI ENDPOINTS!"}
\ No newline at end of file
+    return {"message": "[GOHUB] - [HOAIBAO] - MBBANK FASTAPI ENDPOINTS!"}
+
+# Liveness: the HTTP app answers. Container healthchecks use this, a down hub must not restart the API
+@app.get("/livez")
+async def livez():
+    return {"ok": True}
+
+# Readiness: at least one pooled grid session is usable
+@app.get("/healthz")
+async def healthz():
+    ok = await asyncio.to_thread(app.state.driver_pool.healthy)
+    return JSONResponse({"ok": ok}, status_code=200 if ok else 503)
\ No newline at end of file
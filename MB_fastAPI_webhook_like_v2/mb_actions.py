@@ -3,28 +3,40 @@ import time
 import logging
 import sys
 import os
+import re
+import random
 from datetime import datetime
 import pytz  # ✅ ADD: Import pytz for proper timezone handling
 
+import atexit
 import base64
+import hashlib
+from collections import OrderedDict
+from itertools import islice
 
-from routers.captcha_reading import read_captcha
+# Optional C HTML parser, only used when the in-page table script can't run
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+# routers.captcha_reading is imported on first OCR, it builds the EasyOCR model at import
 
 # Import Selenium components
-from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException
+from selenium.common.exceptions import TimeoutException, JavascriptException
+
+# Resolved once, formatTime runs for every log record
+_VN_TZ = pytz.timezone('Asia/Ho_Chi_Minh')
 
 # ✅ FIXED: Proper Vietnam timezone formatter using pytz
 class VietnamFormatter(logging.Formatter):
     """Custom formatter that always uses Vietnam timezone - FIXED VERSION"""
     def formatTime(self, record, datefmt=None):
         # Force Vietnam timezone for all log timestamps
-        vietnam_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-        dt = datetime.fromtimestamp(record.created, vietnam_tz)
+        dt = datetime.fromtimestamp(record.created, _VN_TZ)
         if datefmt:
             return dt.strftime(datefmt)
         return dt.strftime('%Y-%m-%d %H:%M:%S %Z')
@@ -39,73 +51,80 @@ console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 logger.setLevel(logging.INFO)
 
-# global driver
-driver = None
+# Sessions come from the shared pre-warmed pool in driver.py
+from driver import default_pool as _DRIVER_POOL
 
 # docker is running -> selenium hub is running on http://selenium-hub:4444/wd/hub
 # Get the correct Selenium Grid URL based on environment
+# In Docker environment, always use the internal container name
+HUB_URL = "http://selenium-hub-webhook:4444/wd/hub"
+
+# Login attempts per log_in_v2 call, read once at import
+MAX_ATTEMPTS = int(os.getenv("MB_LOGIN_MAX_ATTEMPTS", "3"))  # Default to 3 attempts if not set
+# Exponential backoff (plus jitter) between login attempts that reload the page, in seconds
+LOGIN_BACKOFF_BASE = 0.2
+LOGIN_BACKOFF_MAX = 3.0
+
+# --- locators ---
+# Every MB Bank page address and element locator, so a DOM change on their side is fixed here.
+# The *_JS snippets further down embed the same table and "no data" selectors
+LOGIN_URL = "https://ebank.mbbank.com.vn/cp/pl/login"
+TRANSACTION_INQUIRY_URL = "https://ebank.mbbank.com.vn/cp/account-info/transaction-inquiry"
+
+# Close buttons of the MB welcome dialog and generic popups, matched in a single query
+POPUP_CLOSE_CSS = "#mat-dialog-0 mbb-dialog-common button, button.close, button.btn-close"
+
+# Login form
+CORP_ID_XPATH = '//*[@id="corp-id"]'
+CAPTCHA_INPUT_XPATH = '//*[@id="main-content"]/mbb-welcome/div/div/div[2]/div[2]/div/mbb-login/form/div/div[2]/mbb-word-captcha/div/div[2]/div[1]/input'
+SIGNIN_BUTTON_XPATH = '//*[@id="login-btn"]'
+CAPTCHA_IMG_CSS = "mbb-word-captcha img:not([alt='reload'])"
+# The captcha widget's own "new image" control
+CAPTCHA_REFRESH_CSS = "mbb-word-captcha .refresh, mbb-word-captcha img[alt='reload']"
+
+# Login error dialog, whichever mat-dialog-N hosts the mbb-dialog-error (plus a generic fallback)
+ERROR_DIALOG_CSS = "mbb-dialog-error"
+ERROR_DIALOG_XPATH = "//mbb-dialog-error//p | //div[contains(@class, 'error')]//p"
+ERROR_DIALOG_CLOSE_XPATH = "//mbb-dialog-error//button | //button[contains(@class, 'close')]"
+
+# Transaction inquiry controls. Short CSS locators instead of the absolute XPaths, the
+# from-date picker is the first mbb-date-time-picker in the inquiry form
+PERIOD_RADIO_CSS = "#mat-radio-3 label > div:first-child > div:first-child"
+FROM_DATE_INPUT_CSS = "mbb-transaction-inquiry-v2 form mbb-date-time-picker input"
+QUERY_BUTTON_CSS = "#btn-query"
+
+# Results: balance summary block and the transaction table (id first, component fallback)
+BALANCE_SUMMARY_XPATH = "//div[contains(@class, 'summary') or contains(@class, 'balance')]"
+TRANSACTION_TABLE_CSS = "#tbl-transaction-history"
+TRANSACTION_TABLE_FALLBACK_CSS = "mbb-table-history table"
+# First data row of either table layout (goes stale once a query re-renders the results)
+TABLE_FIRST_ROW_CSS = "#tbl-transaction-history tbody tr, mbb-table-history table tbody tr"
+# "No data" notice shown instead of rows ("Không có dữ liệu" is Vietnamese for "No data")
+NO_DATA_XPATH = "//span[contains(text(), 'Không có dữ liệu')]"
+
 def get_selenium_hub_url():
     """Get the correct Selenium Hub URL based on environment"""
-    # In Docker environment, always use the internal container name
-    return "http://selenium-hub-webhook:4444/wd/hub"
+    return HUB_URL
 
-# Add a simple connection test function
-def test_selenium_hub_connection():
-    """Test direct connection to Selenium hub without WebDriver"""
-    try:
-        # Use subprocess for a simple connection test that doesn't depend on async
-        import subprocess
-        result = subprocess.run(
-            ["curl", "-s", "http://selenium-hub:4444/status"], 
-            capture_output=True, 
-            text=True, 
-            timeout=5
-        )
-        if result.returncode == 0 and "ready" in result.stdout:
-            logger.info("Selenium Grid is available (direct curl test)")
-            return True
-        else:
-            logger.error(f"Selenium Grid connection test failed: {result.returncode}")
-            return False
-    except Exception as e:
-        logger.error(f"Error testing Selenium Grid connection: {e}")
-        return False
+def acquire_driver():
+    """Check a pre-warmed session out of the pool instead of starting a new one per login"""
+    driver = _DRIVER_POOL.checkout()
+    if driver:
+        logger.info("Checked out pooled WebDriver session")
+    else:
+        logger.error("No WebDriver session available from the pool")
+    return driver
 
-def setup_driver():
-    global driver
-    try:
-        options = webdriver.EdgeOptions()
-        options.add_argument("--start-maximized")
-        options.add_argument("--disable-notifications")
-        options.add_argument("--headless")  # Run in headless mode
-        
-        # Add these options to help with access denied issues
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.71 Safari/537.36 Edg/97.0.1072.62")
-        
-        # Set up capabilities with more detailed configuration
-        options.set_capability("browserName", "MicrosoftEdge")
-        options.set_capability("platformName", "linux")
-        
-        # Add HTTP client configuration with higher timeouts
-        options.set_capability("se:options", {
-            "timeouts": {"implicit": 15000, "pageLoad": 30000, "script": 30000}
-        })
-        
-        # Create a new WebDriver session
-        driver = webdriver.Remote(
-            command_executor=get_selenium_hub_url(),
-            options=options,
-            keep_alive=True
-        )
-        
-        logger.info("Created new WebDriver session")
-        return driver
-    except Exception as e:
-        logger.error(f"Error setting up WebDriver: {e}")
-        return None
+def release_driver(driver):
+    """Hand a session back to the pool, cookies are wiped and the page reset to about:blank"""
+    forget_session(driver)
+    _DRIVER_POOL.checkin(driver)
+
+# Kept for older callers
+setup_driver = acquire_driver
+
+# Every session, including ones still checked out, is quit when the process exits
+atexit.register(_DRIVER_POOL.close)
 
 # Modify functions to accept driver as a parameter
 # def log_in(driver, username: str, password: str, corp_id: str):
@@ -382,6 +401,77 @@ def setup_driver():
 
 # keep trying if wrong captcha
 # stop if wrong corp_id, username or password 1 time
+# Captcha image hash -> OCR answer not (yet) rejected with GW715, so a repeated image skips OCR
+CAPTCHA_CACHE_SIZE = 512
+_CAPTCHA_CACHE = OrderedDict()
+
+def _remember_captcha(captcha_hash, captcha_text):
+    """Store a captcha answer, evicting the oldest once the cache is full"""
+    _CAPTCHA_CACHE[captcha_hash] = captcha_text
+    _CAPTCHA_CACHE.move_to_end(captcha_hash)
+    while len(_CAPTCHA_CACHE) > CAPTCHA_CACHE_SIZE:
+        _CAPTCHA_CACHE.popitem(last=False)
+
+def capture_element_png(driver, element):
+    """Screenshot just `element` through CDP and return the PNG bytes"""
+    rect = element.rect
+    result = driver.execute("executeCdpCommand", {
+        "cmd": "Page.captureScreenshot",
+        "params": {
+            "format": "png",
+            "clip": {"x": rect["x"], "y": rect["y"], "width": rect["width"], "height": rect["height"], "scale": 1}
+        }
+    })["value"]
+    return base64.b64decode(result["data"])
+
+# Sets each login input and fires input/change so Angular's form model picks the value up.
+# Returns the name of the first missing field, or null when everything was filled
+FILL_LOGIN_FORM_JS = """
+    const fields = [
+        ["corp-id", document.getElementById("corp-id"), arguments[0]],
+        ["user-id", document.getElementById("user-id"), arguments[1]],
+        ["password", document.getElementById("password"), arguments[2]],
+        ["captcha", document.evaluate(arguments[4], document, null,
+            XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue, arguments[3]]
+    ];
+    for (const [name, el] of fields) {
+        if (!el) return name;
+    }
+    for (const [, el, value] of fields) {
+        el.focus();
+        el.value = value;
+        el.dispatchEvent(new Event("input", {bubbles: true}));
+        el.dispatchEvent(new Event("change", {bubbles: true}));
+        el.dispatchEvent(new Event("blur"));
+    }
+    return null;
+"""
+
+def _refresh_captcha(driver, old_src):
+    """Click the captcha's reload control and wait for a new image, True if one showed up"""
+    try:
+        buttons = [b for b in driver.find_elements(By.CSS_SELECTOR, CAPTCHA_REFRESH_CSS) if b.is_displayed()]
+        if not buttons:
+            return False
+        buttons[0].click()
+        WebDriverWait(driver, 3, poll_frequency=0.2).until(
+            lambda d: d.find_element(By.CSS_SELECTOR, CAPTCHA_IMG_CSS).get_attribute("src") != old_src
+        )
+        logger.info("Captcha refreshed in place")
+        return True
+    except Exception as e:
+        logger.warning(f"Could not refresh captcha in place, reloading login page: {e}")
+        return False
+
+def _login_settled(driver):
+    """Expected condition for the sign-in click: 'success', 'error' or False while still pending"""
+    current_url = driver.current_url
+    if "/cp/" in current_url and "login" not in current_url:
+        return "success"
+    if driver.find_elements(By.CSS_SELECTOR, ERROR_DIALOG_CSS):
+        return "error"
+    return False
+
 def log_in_v2(driver, username: str, password: str, corp_id: str):
     """
     Intelligent login function for MB Business Banking:
@@ -389,91 +479,62 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
     - Stop immediately if wrong credentials or account locked (other error codes)
     """
     
-    max_attempts = int(os.getenv("MB_LOGIN_MAX_ATTEMPTS", "3"))  # Default to 3 attempts if not set
+    max_attempts = MAX_ATTEMPTS
     logger.info(f"🔐 Starting intelligent login process (max {max_attempts} attempts)")
     
+    reload_page = True
     for attempt in range(max_attempts):
         logger.info(f"Attempting to log in, attempt {attempt + 1}/{max_attempts}")
         
-        # Close any popup that might be open from previous failed attempt
-        try:
-            close_button_xpaths = [
-                "//button[contains(text(), 'Close')]",
-                "//button[contains(text(), 'Đóng')]",  # Vietnamese "Close"
-                "//button[contains(@class, 'close')]"
-            ]
+        # After a GW715 the captcha was refreshed in place, the login page is still loaded
+        if reload_page:
+            if attempt:
+                # Back off before hitting the login page again so a fast-failing server isn't hammered
+                delay = min(LOGIN_BACKOFF_BASE * 2 ** (attempt - 1) + random.random() * 0.1, LOGIN_BACKOFF_MAX)
+                logger.info(f"⏳ Waiting {delay:.2f}s before retrying login")
+                time.sleep(delay)
+            # Navigate to the login page (this drops any popup left by the previous attempt)
+            url = LOGIN_URL
+            logger.info(f"Navigating to: {url}")
+            driver.get(url)
             
-            for xpath in close_button_xpaths:
-                try:
-                    close_buttons = driver.find_elements(By.XPATH, xpath)
-                    if close_buttons:
-                        for button in close_buttons:
-                            if button.is_displayed():
-                                logger.info("Closing popup...")
-                                button.click()
-                                time.sleep(0.5)
-                                break
-                except:
-                    continue
-        except:
-            pass
-                
-        # Navigate to the login page
-        url = 'https://ebank.mbbank.com.vn/cp/pl/login'
-        logger.info(f"Navigating to: {url}")
-        driver.get(url)
-        
-        # OPTIMIZED: Faster popup clearing with shorter timeouts
-        try:
-            close_button_xpaths = [
-                '//*[@id="mat-dialog-0"]/mbb-dialog-common/div/div[4]/button',
-                "//button[contains(@class, 'close')]",
-                "//button[contains(@class, 'btn-close')]"
-            ]
+            # Page load wait: proceed once the login form's corp-id field is rendered
+            try:
+                WebDriverWait(driver, 10, poll_frequency=0.1).until(
+                    EC.presence_of_element_located((By.XPATH, CORP_ID_XPATH))
+                )
+            except TimeoutException:
+                logger.warning("⚠️ Login form not rendered after 10s, continuing anyway")
             
-            for xpath in close_button_xpaths:
-                try:
-                    WebDriverWait(driver, 1.5).until(EC.presence_of_element_located((By.XPATH, xpath)))
-                    close_buttons = driver.find_elements(By.XPATH, xpath)
-                    if close_buttons:
-                        for button in close_buttons:
-                            if button.is_displayed():
-                                logger.info(f"Closing initial popup using {xpath}...")
-                                button.click()
-                                time.sleep(0.3)
-                                break
-                except:
-                    continue
-        except Exception as popup_error:
-            pass
-                    
-        # Page load wait
-        time.sleep(1)
+            # Close the welcome popup if there is one: one query for every known close button, no waiting
+            try:
+                close_buttons = driver.find_elements(By.CSS_SELECTOR, POPUP_CLOSE_CSS)
+                for button in close_buttons:
+                    if button.is_displayed():
+                        logger.info("Closing initial popup...")
+                        button.click()
+                        # Proceed as soon as the dialog has closed instead of a fixed pause
+                        try:
+                            WebDriverWait(driver, 2, poll_frequency=0.1).until(EC.invisibility_of_element(button))
+                        except TimeoutException:
+                            pass
+                        break
+            except Exception as popup_error:
+                pass
+        reload_page = True
         
         current_url = driver.current_url
         
-        # OPTIMIZED: Faster captcha detection with prioritized selectors
+        # Captcha image: one wait on a selector that covers both known layouts
         captcha_img = None
-        # //*[@id="main-content"]/mbb-welcome/div/div/div[2]/div[2]/div/mbb-login/form/div/div[2]/mbb-word-captcha/div/div[2]/div/div/img
-        captcha_locating_methods = [
-            {"method": "xpath", "selector": '//*[@id="main-content"]/mbb-welcome/div/div/div[2]/div[2]/div/mbb-login/form/div/div[2]/mbb-word-captcha/div/div[2]/div/div/img'},
-            {"method": "xpath", "selector": '//*[@id="main-content"]/mbb-welcome/div/div/div[2]/div[2]/div/mbb-login/form/div/div[2]/mbb-word-captcha/div/div[2]/div/div'}
-        ]
-                
         captcha_found = False
-        for method in captcha_locating_methods:
-            try:
-                if method['method'] == 'xpath':
-                    try:
-                        captcha_img = WebDriverWait(driver, 3).until(
-                            EC.presence_of_element_located((By.XPATH, method['selector']))
-                        )
-                        captcha_found = True
-                        break
-                    except TimeoutException:
-                        continue
-            except Exception as e:
-                continue
+        try:
+            captcha_img = WebDriverWait(driver, 4).until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, CAPTCHA_IMG_CSS))
+            )
+            captcha_found = True
+        except TimeoutException:
+            pass
                 
         if not captcha_found:
             logger.error("Could not find captcha with any method")
@@ -490,68 +551,49 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
         
         # Process captcha
         captcha_text = ""
-        if img_src.startswith("data:image"):
-            try:
-                img_data = img_src.split(",")[1]
-                img_bytes = base64.b64decode(img_data)
-                captcha_text = read_captcha(img_bytes, is_bytes=True, save_images=True).replace(" ", "")
+        try:
+            if img_src.startswith("data:image"):
+                # Decode straight from the encoded URL, past the "data:image/...;base64," header
+                comma = img_src.find(",") + 1
+                img_bytes = base64.b64decode(memoryview(img_src.encode("ascii"))[comma:])
+            else:
+                # Not inline, grab the rendered pixels instead of downloading the image again
+                logger.info("Captcha image is not a data URL, capturing it from the page")
+                img_bytes = capture_element_png(driver, captcha_img)
+            captcha_hash = hashlib.sha1(img_bytes).digest()
+            captcha_text = _CAPTCHA_CACHE.get(captcha_hash)
+            if captcha_text is not None:
+                _CAPTCHA_CACHE.move_to_end(captcha_hash)
+                logger.info(f"Captcha seen before, reusing: {captcha_text}")
+            else:
+                from routers.captcha_reading import read_captcha
+                captcha_text = read_captcha(img_bytes, is_bytes=True, save_images=True)
                 logger.info(f"Captcha read as: {captcha_text}")
-            except Exception as e:
-                logger.error(f"Error processing captcha: {e}")
-                continue
-        else:
-            logger.error("Captcha image is not a data URL")
+                if captcha_text:
+                    # Provisional until the bank answers, a GW715 below evicts it again
+                    _remember_captcha(captcha_hash, captcha_text)
+        except Exception as e:
+            logger.error(f"Error processing captcha: {e}")
             continue
 
         # Form filling
         try:
             # Corp ID field
-            corp_id_xpath = '//*[@id="corp-id"]'
             WebDriverWait(driver, 8).until(
-                EC.element_to_be_clickable((By.XPATH, corp_id_xpath))
+                EC.element_to_be_clickable((By.XPATH, CORP_ID_XPATH))
             )
-            corp_id_field = driver.find_element(By.XPATH, corp_id_xpath)
-            corp_id_field.clear()
-            corp_id_field.send_keys(corp_id)
-            logger.info("Corp ID field filled")
-            time.sleep(0.5)
-            
-            # Username field
-            username_xpath = '//*[@id="user-id"]'
-            username_field = driver.find_element(By.XPATH, username_xpath)
-            username_field.clear()
-            username_field.send_keys(username)
-            logger.info("Username field filled")
-            time.sleep(0.5)
             
-            # Password field
-            password_xpath = '//*[@id="password"]'
-            password_field = driver.find_element(By.XPATH, password_xpath)
-            password_field.clear()
-            password_field.send_keys(password)
-            logger.info("Password field filled")
-            time.sleep(0.5)
-            
-            # Captcha input
-            captcha_input_xpath = '//*[@id="main-content"]/mbb-welcome/div/div/div[2]/div[2]/div/mbb-login/form/div/div[2]/mbb-word-captcha/div/div[2]/div[1]/input'
-            try:
-                captcha_field = WebDriverWait(driver, 2).until(
-                    EC.element_to_be_clickable((By.XPATH, captcha_input_xpath))
-                )
-                captcha_field.clear()
-                for char in captcha_text:
-                    captcha_field.send_keys(char)
-                    time.sleep(0.05)
-                logger.info("Captcha field filled")
-            except Exception as e:
-                raise Exception("Captcha input field not found")
-            
-            time.sleep(0.3)
+            # Fill corp ID, username, password and captcha in one round-trip
+            missing_field = driver.execute_script(
+                FILL_LOGIN_FORM_JS, corp_id, username, password, captcha_text, CAPTCHA_INPUT_XPATH
+            )
+            if missing_field:
+                raise Exception(f"Login field not found: {missing_field}")
+            logger.info("Login form filled (corp ID, username, password, captcha)")
             
             # Sign-in button click
-            signin_button_xpath = '//*[@id="login-btn"]'
             signin_button = WebDriverWait(driver, 3).until(
-                EC.element_to_be_clickable((By.XPATH, signin_button_xpath))
+                EC.element_to_be_clickable((By.XPATH, SIGNIN_BUTTON_XPATH))
             )
             
             try:
@@ -564,8 +606,11 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
             
             logger.info("Logging in, please wait...")
             
-            # ✅ SIMPLIFIED: Wait 2 seconds then check login success
-            time.sleep(2)  # Wait for login process
+            # Wait until the bank either moves past the login page or shows an error dialog (max 5s)
+            try:
+                WebDriverWait(driver, 5, poll_frequency=0.2).until(_login_settled)
+            except TimeoutException:
+                logger.warning("Login result not visible after 5s, checking the page anyway")
             
             try:
                 current_url = driver.current_url
@@ -581,29 +626,21 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
                 
                 if any(success_indicators):
                     logger.info(f"✅ LOGIN SUCCESS!")
+                    _remember_captcha(captcha_hash, captcha_text)
                     return True  # Login successful
                 else:
                     # ✅ INTELLIGENT ERROR DETECTION
                     try:
-                        # Look for error dialog - try multiple XPaths for robustness
-                        error_dialog_xpaths = [
-                            '//*[@id="mat-dialog-0"]/mbb-dialog-error/div/div[1]/div[2]/b/p',
-                            '//*[@id="mat-dialog-1"]/mbb-dialog-error/div/div[1]/div[2]/b/p',
-                            '//*[@id="mat-dialog-2"]/mbb-dialog-error/div/div[1]/div[2]/b/p',
-                            '//*[@id="mat-dialog-3"]/mbb-dialog-error/div/div[1]/div[2]/b/p',
-                            "//mbb-dialog-error//p",
-                            "//div[contains(@class, 'error')]//p"
-                        ]
-                        
+                        # Look for error dialog - one query covers every mat-dialog-N and the class-based fallback
                         error_message = None
-                        for xpath in error_dialog_xpaths:
-                            try:
-                                error_element = driver.find_element(By.XPATH, xpath)
-                                if error_element.is_displayed() and error_element.text.strip():
-                                    error_message = error_element
-                                    break
-                            except:
-                                continue
+                        try:
+                            error_elements = driver.find_elements(By.XPATH, ERROR_DIALOG_XPATH)
+                            error_message = next(
+                                (el for el in error_elements if el.is_displayed() and el.text.strip()),
+                                None
+                            )
+                        except Exception:
+                            pass
                         
                         if error_message:
                             error_text = error_message.text.strip()
@@ -613,15 +650,20 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
                             if 'GW715' in error_text:
                                 # CAPTCHA ERROR - Continue retrying
                                 logger.warning(f"⚠️ GW715 (Captcha) error - will retry (attempt {attempt + 1}/{max_attempts})")
+                                _CAPTCHA_CACHE.pop(captcha_hash, None)
                                 
                                 # Close error dialog quickly
                                 try:
-                                    close_button = driver.find_element(By.XPATH, "//mbb-dialog-error//button | //button[contains(@class, 'close')]")
+                                    close_button = driver.find_element(By.XPATH, ERROR_DIALOG_CLOSE_XPATH)
                                     close_button.click()
                                     time.sleep(0.3)
                                 except:
                                     pass
                                 
+                                # Only the captcha was wrong: ask for a new one instead of reloading the whole page
+                                if _refresh_captcha(driver, img_src):
+                                    reload_page = False
+                                
                                 continue  # Retry with next attempt
                                 
                             elif 'GW18' in error_text:
@@ -631,7 +673,7 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
                                 
                                 # Close dialog
                                 try:
-                                    close_button = driver.find_element(By.XPATH, "//mbb-dialog-error//button | //button[contains(@class, 'close')]")
+                                    close_button = driver.find_element(By.XPATH, ERROR_DIALOG_CLOSE_XPATH)
                                     close_button.click()
                                     time.sleep(0.2)
                                 except:
@@ -646,7 +688,7 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
                                 
                                 # Close dialog
                                 try:
-                                    close_button = driver.find_element(By.XPATH, "//mbb-dialog-error//button | //button[contains(@class, 'close')]")
+                                    close_button = driver.find_element(By.XPATH, ERROR_DIALOG_CLOSE_XPATH)
                                     close_button.click()
                                     time.sleep(0.2)
                                 except:
@@ -676,25 +718,42 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
     return False
 
 
+# Recent positive session checks, id(driver) -> (checked_at, session_id). Only live sessions are
+# cached so a fresh log_in_v2 is seen on the very next check
+SESSION_CHECK_TTL = 5.0
+_session_cache = {}
+
+def forget_session(driver):
+    """Drop any cached session check for this driver"""
+    _session_cache.pop(id(driver), None)
+
 def check_session(driver):
     """
     Check if the WebDriver session is still active and return the session ID.
     If the session is invalid or logged out, return None.
+    A live result is reused for SESSION_CHECK_TTL seconds before the browser is asked again.
     """
+    now = time.monotonic()
+    cached = _session_cache.get(id(driver))
+    if cached and now - cached[0] < SESSION_CHECK_TTL and cached[1] == driver.session_id:
+        return cached[1]
     try:
-        # Perform a lightweight call to check if the session is still active
-        current_url = driver.current_url  # This will raise an exception if the session is invalid
+        # One round-trip, raises if the session is invalid
+        current_url = driver.execute_script("return location.href") or ""
         # logger.info(f"Current URL during session check: {current_url}")
 
         # Check if the current URL indicates a logged-out state
         if "login" in current_url.lower() or "session-expired" in current_url.lower():
             logger.warning("Session appears to be logged out or expired.")
+            forget_session(driver)
             return None
 
         # If the session is active, return the session ID
+        _session_cache[id(driver)] = (now, driver.session_id)
         return driver.session_id
     except Exception as e:
         logger.error(f"Error checking WebDriver session: {e}")
+        forget_session(driver)
         return None
 
 # Modify log_out to accept driver parameter
@@ -703,6 +762,7 @@ def log_out(driver):
     if driver:
         try:
             logger.info("Logging out and quitting WebDriver session")
+            forget_session(driver)
             # Note: We don't call driver.quit() here since it's managed by FastAPI lifecycle
             # Just perform the MB Bank logout if needed
             try:
@@ -717,10 +777,146 @@ def log_out(driver):
         logger.warning("No active driver to log out")
 
 
+# Balance summary figures, e.g. "Opening = 1,234,000"
+_OPENING_RE = re.compile(r'Opening[=\s]*([0-9,]+)')
+_CLOSING_RE = re.compile(r'Closing[=\s]*([0-9,]+)')
+_CREDIT_RE = re.compile(r'Credit[=\s]*([0-9,]+)')
+_DEBIT_RE = re.compile(r'Debit[=\s]*([0-9,]+)')
+
+# Text of every balance/summary block on the transaction page, joined into one string
+BALANCE_SUMMARY_JS = """
+    return Array.from(document.querySelectorAll("div[class*='summary'], div[class*='balance']"),
+        el => el.innerText).join("\\n");
+"""
+
+# True once the loading spinner is gone or hidden (offsetParent is null under display:none)
+LOADING_DONE_JS = """
+    const el = document.querySelector('.loadingActivityIndicator');
+    return !el || el.offsetParent === null;
+"""
+
+# Replace an input's value the way typing would, so Angular's form control sees it
+SET_INPUT_VALUE_JS = """
+    const el = arguments[0];
+    el.focus();
+    el.value = arguments[1];
+    el.dispatchEvent(new Event("input", {bubbles: true}));
+    el.dispatchEvent(new Event("change", {bubbles: true}));
+    el.blur();
+"""
+
+# Transaction table has at least one row, or the "no data" notice is shown
+TABLE_READY_JS = """
+    if (document.querySelector("#tbl-transaction-history tbody tr, mbb-table-history table tbody tr")) return true;
+    const empty = document.evaluate("//span[contains(text(), 'Không có dữ liệu')]", document, null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    return !!(empty && empty.offsetParent);
+"""
+
+# Column order of the MB transaction history table
+TRANSACTION_COLUMNS = (
+    'STT', 'HÀNH ĐỘNG', 'SỐ BÚT TOÁN', 'PHÁT SINH NỢ', 'PHÁT SINH CÓ', 'SỐ DƯ',
+    'ĐƠN VỊ THỤ HƯỞNG/ĐƠN VỊ CHUYỂN', 'NỘI DUNG', 'NGÀY GIAO DỊCH', 'NGÀY HẠCH TOÁN'
+)
+
+# Whether the "no data" notice is shown, and the first visible transaction table (most likely id first)
+TABLE_STATE_JS = """
+    const visible = el => !!(el && el.offsetParent);
+    const empty = document.evaluate("//span[contains(text(), 'Không có dữ liệu')]", document, null,
+        XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    const table = [document.getElementById("tbl-transaction-history"),
+                   document.querySelector("mbb-table-history table")].find(visible) || null;
+    return {empty: visible(empty), table: table};
+"""
+
+# Trimmed text of the first 10 cells of every body row of the table passed as arguments[0].
+# With a "YYYYMMDDHHMMSS" key in arguments[1], rows dated before it are dropped in the browser
+# (only counted), so they never cross the wire. Rows with an unusual date are left for Python
+TABLE_ROWS_JS = """
+    const fromKey = arguments[1];
+    const rows = [];
+    let filtered = 0;
+    for (const row of arguments[0].querySelectorAll("tbody tr")) {
+        const cells = Array.from(row.cells).slice(0, 10).map(cell => cell.innerText.trim());
+        const d = cells[8];
+        if (fromKey && d && d.length === 19 && d[2] === "/" && d[5] === "/") {
+            const key = d.substr(6, 4) + d.substr(3, 2) + d.substr(0, 2) + d.substr(11, 2) + d.substr(14, 2) + d.substr(17, 2);
+            if (/^[0-9]{14}$/.test(key) && key < fromKey) {
+                if (cells.length >= 10 && cells[2]) filtered++;
+                continue;
+            }
+        }
+        rows.push(cells);
+    }
+    return {rows: rows, filtered: filtered};
+"""
+
+# Seconds each further page gets to replace the table after its "next" click
+PAGE_CHANGE_TIMEOUT = 5
+
+# Async: clicks through up to arguments[1] further pages inside the browser and reads each one like
+# TABLE_ROWS_JS (arguments[0] is the from-date key). A MutationObserver notices the new page, at most
+# arguments[2] ms per page. Calls back with {pages: [{rows, filtered}], stopped} and never throws
+PAGINATED_ROWS_JS = """
+    const [fromKey, maxPages, pageTimeout] = arguments;
+    const done = arguments[arguments.length - 1];
+    const readRows = function () {""" + TABLE_ROWS_JS + """};
+    const findTable = () => [document.getElementById("tbl-transaction-history"),
+                             document.querySelector("mbb-table-history table")].find(el => el && el.offsetParent) || null;
+    // First row's id, read from whichever table findTable() picked (the id or the component layout)
+    const firstId = (table) => {
+        const cell = table ? table.querySelector("tbody tr td:nth-child(3)") : null;
+        return cell ? cell.innerText.trim() : null;
+    };
+    const pageChanged = (root, oldId) => new Promise(resolve => {
+        const observer = new MutationObserver(() => {
+            if (firstId(findTable()) !== oldId) { clearTimeout(timer); observer.disconnect(); resolve(true); }
+        });
+        const timer = setTimeout(() => { observer.disconnect(); resolve(false); }, pageTimeout);
+        observer.observe(root, {childList: true, subtree: true, characterData: true});
+    });
+    const pages = [];
+    (async () => {
+        for (let page = 0; page < maxPages; page++) {
+            const buttons = document.querySelectorAll("#page-items button");
+            const next = buttons.length >= 2 ? buttons[buttons.length - 2] : null;
+            if (!next || next.hasAttribute("disabled")) return "last_page";
+            const table = findTable();
+            if (!table) return "no_table";
+            const changed = pageChanged(table.parentElement || table, firstId(table));
+            next.click();
+            if (!await changed) return "timeout";
+            pages.push(readRows(findTable(), fromKey));
+        }
+        return "max_pages";
+    })().then(stopped => done({pages: pages, stopped: stopped}),
+              error => done({pages: pages, stopped: String(error)}));
+"""
+
+# Balance extraction is switched off for now (MB_EXTRACT_ACCOUNT_INFO=1 turns it back on),
+# while off extract_account_info returns the placeholder figures without touching the driver
+EXTRACT_ACCOUNT_INFO = os.getenv("MB_EXTRACT_ACCOUNT_INFO", "0").lower() in ("1", "true", "yes")
+
+def _placeholder_account_info():
+    return {
+        "account_number": "",
+        "account_name": "",
+        "balance": "",
+        "currency": "VND",
+        "last_updated": datetime.now().strftime('%d-%m-%Y %H:%M:%S'),
+        "opening_balance": "0",
+        "closing_balance": "0",
+        "total_credit": "0",
+        "total_debit": "0"
+    }
+
 def extract_account_info(driver):
     """
     Extract account information and balance from the MB Bank interface.
+    Returns placeholder figures straight away unless EXTRACT_ACCOUNT_INFO is on.
     """
+    if not EXTRACT_ACCOUNT_INFO:
+        return _placeholder_account_info()
     try:
         account_info = {
             "account_number": "",
@@ -734,62 +930,22 @@ def extract_account_info(driver):
         try:
             # Wait for balance summary section to load after query
             WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, "//div[contains(@class, 'summary') or contains(@class, 'balance')]"))
+                EC.presence_of_element_located((By.XPATH, BALANCE_SUMMARY_XPATH))
             )
             
-            # Try to extract opening balance
-            try:
-                opening_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Opening') or contains(text(), 'Số dư đầu')]")
-                for elem in opening_elements:
-                    parent = elem.find_element(By.XPATH, "./..")
-                    balance_text = parent.text
-                    # Extract the numeric part
-                    import re
-                    opening_match = re.search(r'Opening[=\s]*([0-9,]+)', balance_text)
-                    if opening_match:
-                        account_info["opening_balance"] = opening_match.group(1).strip()
-                        break
-            except Exception as e:
-                logger.warning(f"Could not extract opening balance: {e}")
-            
-            # Try to extract closing balance
-            try:
-                closing_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Closing') or contains(text(), 'Số dư cuối')]")
-                for elem in closing_elements:
-                    parent = elem.find_element(By.XPATH, "./..")
-                    balance_text = parent.text
-                    closing_match = re.search(r'Closing[=\s]*([0-9,]+)', balance_text)
-                    if closing_match:
-                        account_info["closing_balance"] = closing_match.group(1).strip()
-                        break
-            except Exception as e:
-                logger.warning(f"Could not extract closing balance: {e}")
-            
-            # Try to extract credit total
-            try:
-                credit_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Credit') or contains(text(), 'Có')]")
-                for elem in credit_elements:
-                    parent = elem.find_element(By.XPATH, "./..")
-                    balance_text = parent.text
-                    credit_match = re.search(r'Credit[=\s]*([0-9,]+)', balance_text)
-                    if credit_match:
-                        account_info["total_credit"] = credit_match.group(1).strip()
-                        break
-            except Exception as e:
-                logger.warning(f"Could not extract credit total: {e}")
-            
-            # Try to extract debit total  
-            try:
-                debit_elements = driver.find_elements(By.XPATH, "//*[contains(text(), 'Debit') or contains(text(), 'Nợ')]")
-                for elem in debit_elements:
-                    parent = elem.find_element(By.XPATH, "./..")
-                    balance_text = parent.text
-                    debit_match = re.search(r'Debit[=\s]*([0-9,]+)', balance_text)
-                    if debit_match:
-                        account_info["total_debit"] = debit_match.group(1).strip()
-                        break
-            except Exception as e:
-                logger.warning(f"Could not extract debit total: {e}")
+            # One round-trip for the summary text, then match every figure locally
+            summary_text = driver.execute_script(BALANCE_SUMMARY_JS) or ""
+            for key, pattern in (
+                ("opening_balance", _OPENING_RE),
+                ("closing_balance", _CLOSING_RE),
+                ("total_credit", _CREDIT_RE),
+                ("total_debit", _DEBIT_RE),
+            ):
+                match = pattern.search(summary_text)
+                if match:
+                    account_info[key] = match.group(1).strip()
+                else:
+                    logger.warning(f"Could not extract {key.replace('_', ' ')}")
                 
         except Exception as e:
             logger.warning(f"Could not extract balance information: {e}")
@@ -799,187 +955,271 @@ def extract_account_info(driver):
         logger.error(f"Error extracting account info: {e}")
         return {"last_updated": datetime.now().strftime('%d-%m-%Y %H:%M:%S')}
 
-def extract_transaction_data_from_table_optimized(driver, from_date=None):
+def _rows_from_page_source(driver, from_date_key=None):
     """
-    Optimized for typical case: 1 page with 1-2 transactions
-    Now includes date filtering to remove transactions before from_date
-    
-    Args:
-        driver: WebDriver instance
-        from_date: String in format "DD/MM/YYYY HH:MM" or None
+    Scriptless stand-in for TABLE_READY_JS + TABLE_ROWS_JS when the page blocks scripts (e.g. CSP):
+    waits with plain element lookups, then parses one page_source snapshot with selectolax and
+    drops rows before from_date_key the same way. Returns {"rows", "filtered"} like TABLE_ROWS_JS.
     """
     try:
-        # OPTIMIZED: Quick empty check first (most common case)
-        try:
-            empty_element = driver.find_element(By.XPATH, "//span[contains(text(), 'Không có dữ liệu')]")
-            if empty_element.is_displayed():
-                logger.info("✅ No transactions found")
-                return []
-        except:
-            pass  # Continue if no empty indicator
-        
-        # OPTIMIZED: Reduced wait for typical case
-        time.sleep(0.3)  # REDUCED: 1s → 0.3s
-        
-        # OPTIMIZED: Try most likely table xpath first
-        transaction_table = None
-        priority_xpaths = [
-            '//*[@id="tbl-transaction-history"]',  # Most likely to work
-            '//mbb-table-history//table'           # Second most likely
-        ]
-        
-        for xpath in priority_xpaths:
-            try:
-                table = driver.find_element(By.XPATH, xpath)
-                if table.is_displayed():
-                    transaction_table = table
-                    break
-            except:
+        WebDriverWait(driver, 5, poll_frequency=0.1).until(
+            lambda d: d.find_elements(By.CSS_SELECTOR, TABLE_FIRST_ROW_CSS) or d.find_elements(By.XPATH, NO_DATA_XPATH)
+        )
+    except TimeoutException:
+        logger.warning("Transaction table not ready after 5s, reading it anyway")
+    
+    tree = HTMLParser(driver.page_source)
+    table = tree.css_first(TRANSACTION_TABLE_CSS) or tree.css_first(TRANSACTION_TABLE_FALLBACK_CSS)
+    rows = []
+    filtered = 0
+    if table is None:
+        return {"rows": rows, "filtered": filtered}
+    for row in table.css("tbody tr"):
+        cells = [cell.text(strip=True) for cell in row.css("td")[:10]]
+        d = cells[8] if len(cells) > 8 else ""
+        if from_date_key and len(d) == 19 and d[2] == "/" and d[5] == "/":
+            key = d[6:10] + d[3:5] + d[0:2] + d[11:13] + d[14:16] + d[17:19]
+            if key.isdigit() and key < from_date_key:
+                if len(cells) >= 10 and cells[2]:
+                    filtered += 1
                 continue
-        
-        if not transaction_table:
-            logger.info("ℹ️ No transaction table found")
-            return []
-        
-        # Parse from_date for filtering if provided
-        from_date_dt = None
-        if from_date:
+        rows.append(cells)
+    return {"rows": rows, "filtered": filtered}
+
+def _parse_from_date(from_date):
+    """
+    Parse from_date ("DD/MM/YYYY HH:MM", "DD-MM-YYYY HH:MM" or date only) for filtering.
+    Returns (Vietnam-localized datetime, "YYYYMMDDHHMMSS" key), both None when missing or unparseable.
+    """
+    from_date_dt = None
+    from_date_key = None
+    if from_date:
+        try:
+            # Handle different date formats
+            date_str = from_date.strip()
+            if " - " in date_str:
+                date_str = date_str.replace(" - ", " ")
+            
+            # Parse from_date: Handle both "/" and "-" formats
             try:
-                import datetime
-                import pytz
-                
-                # Handle different date formats
-                date_str = from_date.strip()
-                if " - " in date_str:
-                    date_str = date_str.replace(" - ", " ")
-                
-                # Parse from_date: Handle both "/" and "-" formats
+                # Try DD/MM/YYYY format first
+                from_date_dt = datetime.strptime(date_str, "%d/%m/%Y %H:%M")
+            except ValueError:
                 try:
-                    # Try DD/MM/YYYY format first
-                    from_date_dt = datetime.datetime.strptime(date_str, "%d/%m/%Y %H:%M")
+                    # Try DD-MM-YYYY format (from MB Bank formatting)
+                    from_date_dt = datetime.strptime(date_str, "%d-%m-%Y %H:%M")
                 except ValueError:
                     try:
-                        # Try DD-MM-YYYY format (from MB Bank formatting)
-                        from_date_dt = datetime.datetime.strptime(date_str, "%d-%m-%Y %H:%M")
+                        # Try date only formats
+                        if "/" in date_str:
+                            from_date_dt = datetime.strptime(date_str.split()[0], "%d/%m/%Y")
+                        else:
+                            from_date_dt = datetime.strptime(date_str.split()[0], "%d-%m-%Y")
                     except ValueError:
-                        try:
-                            # Try date only formats
-                            if "/" in date_str:
-                                from_date_dt = datetime.datetime.strptime(date_str.split()[0], "%d/%m/%Y")
-                            else:
-                                from_date_dt = datetime.datetime.strptime(date_str.split()[0], "%d-%m-%Y")
-                        except ValueError:
-                            logger.warning(f"Could not parse from_date for filtering: {from_date}")
-                            from_date_dt = None
-            
-            except Exception as e:
-                logger.warning(f"Error parsing from_date for filtering: {e}")
-                from_date_dt = None
-            
-            if from_date_dt:
-                # Localize to Vietnam timezone
-                vietnam_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-                from_date_dt = vietnam_tz.localize(from_date_dt)
-                logger.info(f"🔍 Will filter transactions after: {from_date_dt}")
-            
-            # except Exception as e:
-            #     logger.warning(f"Error parsing from_date for filtering: {e}")
-            #     from_date_dt = None
+                        logger.warning(f"Could not parse from_date for filtering: {from_date}")
+                        from_date_dt = None
         
-        # OPTIMIZED: Direct tbody row selection (most reliable)
-        try:
-            rows = transaction_table.find_elements(By.XPATH, './/tbody/tr')
-            if not rows:
-                return []
-            
-            transactions = []
-            filtered_count = 0
+        except Exception as e:
+            logger.warning(f"Error parsing from_date for filtering: {e}")
+            from_date_dt = None
+        
+        if from_date_dt:
+            # Both sides are Vietnam local time, so "YYYYMMDDHHMMSS" strings compare like the datetimes
+            from_date_key = from_date_dt.strftime("%Y%m%d%H%M%S")
+            # Localize to Vietnam timezone
+            from_date_dt = _VN_TZ.localize(from_date_dt)
+            logger.info(f"🔍 Will filter transactions after: {from_date_dt}")
+    
+    return from_date_dt, from_date_key
+
+def _transactions_from_rows(rows, filtered_count, from_date, from_date_dt, from_date_key):
+    """Turn table rows (lists of cell texts) into transaction dicts, dropping those before from_date"""
+    transactions = []
+    
+    # OPTIMIZED: Process only data rows (skip validation for speed)
+    for cells in rows:
+        # Full transaction row with an ID (SỐ BÚT TOÁN), checked before building the dict
+        if len(cells) >= 10 and cells[2]:
+            transaction = dict(zip(TRANSACTION_COLUMNS, cells))
             
-            # OPTIMIZED: Process only data rows (skip validation for speed)
-            for row in rows:
-                cells = row.find_elements(By.TAG_NAME, 'td')
+            # NEW: Date filtering logic
+            if from_date_dt:
+                transaction_dt = None
+                trans_date_time = cells[8]  # NGÀY GIAO DỊCH, already trimmed by TABLE_ROWS_JS
                 
-                if len(cells) >= 10:  # Full transaction row
-                    transaction = {
-                        'STT': cells[0].text.strip(),
-                        'HÀNH ĐỘNG': cells[1].text.strip(),
-                        'SỐ BÚT TOÁN': cells[2].text.strip(),
-                        'PHÁT SINH NỢ': cells[3].text.strip(),
-                        'PHÁT SINH CÓ': cells[4].text.strip(),
-                        'SỐ DƯ': cells[5].text.strip(),
-                        'ĐƠN VỊ THỤ HƯỞNG/ĐƠN VỊ CHUYỂN': cells[6].text.strip(),
-                        'NỘI DUNG': cells[7].text.strip(),
-                        'NGÀY GIAO DỊCH': cells[8].text.strip(),
-                        'NGÀY HẠCH TOÁN': cells[9].text.strip()
-                    }
-                    
-                    # OPTIMIZED: Quick validation (just check if has ID)
-                    if not transaction['SỐ BÚT TOÁN']:
-                        continue
-                    
-                    # NEW: Date filtering logic
-                    if from_date_dt:
-                        transaction_dt = None
-                        trans_date_time = transaction.get("NGÀY GIAO DỊCH", "").strip()
+                # Fast path: "DD/MM/YYYY HH:MM:SS" reordered into a sortable key, no parsing
+                row_key = None
+                if len(trans_date_time) == 19 and trans_date_time[2] == '/' and trans_date_time[5] == '/':
+                    t = trans_date_time
+                    row_key = t[6:10] + t[3:5] + t[0:2] + t[11:13] + t[14:16] + t[17:19]
+                    if not row_key.isdigit():
+                        row_key = None
+                
+                if row_key:
+                    # Filter: keep transactions >= from_date (inclusive)
+                    if row_key >= from_date_key:
+                        transactions.append(transaction)
+                    else:
+                        filtered_count += 1
+                        logger.debug(f"🗑️ Filtered out transaction from {trans_date_time} (before {from_date_dt}): {transaction['SỐ BÚT TOÁN']}")
+                elif trans_date_time:
+                    try:
+                        # Parse transaction date and time (already together in format "DD/MM/YYYY HH:MM:SS")
+                        if "/" in trans_date_time and ":" in trans_date_time:
+                            transaction_dt = datetime.strptime(trans_date_time, "%d/%m/%Y %H:%M:%S")
+                        elif "/" in trans_date_time:  # Only date without time
+                            transaction_dt = datetime.strptime(trans_date_time, "%d/%m/%Y")
+                            # Use end of day to be inclusive
+                            transaction_dt = transaction_dt.replace(hour=23, minute=59, second=59)
                         
-                        if trans_date_time:
-                            try:
-                                # Parse transaction date and time (already together in format "DD/MM/YYYY HH:MM:SS")
-                                if "/" in trans_date_time and ":" in trans_date_time:
-                                    transaction_dt = datetime.datetime.strptime(trans_date_time, "%d/%m/%Y %H:%M:%S")
-                                elif "/" in trans_date_time:  # Only date without time
-                                    transaction_dt = datetime.datetime.strptime(trans_date_time, "%d/%m/%Y")
-                                    # Use end of day to be inclusive
-                                    transaction_dt = transaction_dt.replace(hour=23, minute=59, second=59)
-                                
-                                if transaction_dt:
-                                    # Localize to Vietnam timezone
-                                    vietnam_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-                                    transaction_dt = vietnam_tz.localize(transaction_dt)
-                                    
-                                    # Filter: keep transactions >= from_date (inclusive)
-                                    if transaction_dt >= from_date_dt:
-                                        transactions.append(transaction)
-                                    else:
-                                        filtered_count += 1
-                                        logger.debug(f"🗑️ Filtered out transaction from {transaction_dt} (before {from_date_dt}): {transaction['SỐ BÚT TOÁN']}")
-                                else:
-                                    # Can't create datetime - keep transaction (safer approach)
-                                    transactions.append(transaction)
-                            except Exception as date_error:
-                                # Can't parse date - keep transaction (safer approach)
-                                logger.warning(f"Could not parse transaction date '{trans_date_time}': {date_error}")
+                        if transaction_dt:
+                            # Localize to Vietnam timezone
+                            transaction_dt = _VN_TZ.localize(transaction_dt)
+                            
+                            # Filter: keep transactions >= from_date (inclusive)
+                            if transaction_dt >= from_date_dt:
                                 transactions.append(transaction)
+                            else:
+                                filtered_count += 1
+                                logger.debug(f"🗑️ Filtered out transaction from {transaction_dt} (before {from_date_dt}): {transaction['SỐ BÚT TOÁN']}")
                         else:
-                            # No date field - keep transaction (safer approach)
+                            # Can't create datetime - keep transaction (safer approach)
                             transactions.append(transaction)
-                    else:
-                        # No from_date filter - keep all transactions
+                    except Exception as date_error:
+                        # Can't parse date - keep transaction (safer approach)
+                        logger.warning(f"Could not parse transaction date '{trans_date_time}': {date_error}")
                         transactions.append(transaction)
-            
-            # Log filtering results
-            if from_date_dt and filtered_count > 0:
-                logger.info(f"✂️ Filtered out {filtered_count} transactions before {from_date}")
-                logger.info(f"✅ Kept {len(transactions)} transactions after filtering")
-            elif from_date_dt:
-                logger.info(f"✅ All {len(transactions)} transactions are within date range")
+                else:
+                    # No date field - keep transaction (safer approach)
+                    transactions.append(transaction)
             else:
-                logger.info(f"✅ No date filtering applied - {len(transactions)} transactions extracted")
+                # No from_date filter - keep all transactions
+                transactions.append(transaction)
+    
+    # Log filtering results
+    if from_date_dt and filtered_count > 0:
+        logger.info(f"✂️ Filtered out {filtered_count} transactions before {from_date}")
+        logger.info(f"✅ Kept {len(transactions)} transactions after filtering")
+    elif from_date_dt:
+        logger.info(f"✅ All {len(transactions)} transactions are within date range")
+    else:
+        logger.info(f"✅ No date filtering applied - {len(transactions)} transactions extracted")
+    
+    return transactions
+
+def extract_transaction_data_from_table_optimized(driver, from_date=None, parsed_from_date=None):
+    """
+    Optimized for typical case: 1 page with 1-2 transactions
+    Now includes date filtering to remove transactions before from_date
+    
+    Args:
+        driver: WebDriver instance
+        from_date: String in format "DD/MM/YYYY HH:MM" or None
+        parsed_from_date: (from_date_dt, from_date_key) already returned by _parse_from_date, if any
+    """
+    # Parse from_date for filtering if provided (callers reading several pages parse it once)
+    from_date_dt, from_date_key = parsed_from_date or _parse_from_date(from_date)
+    
+    try:
+        try:
+            # Wait until the table has rows or the "no data" notice is up, instead of a fixed pause
+            try:
+                WebDriverWait(driver, 5, poll_frequency=0.1).until(
+                    lambda d: d.execute_script(TABLE_READY_JS)
+                )
+            except TimeoutException:
+                logger.warning("Transaction table not ready after 5s, reading it anyway")
+            
+            # Empty indicator and the visible table, in one round-trip
+            state = driver.execute_script(TABLE_STATE_JS)
+            if state["empty"]:
+                logger.info("✅ No transactions found")
+                return []
             
-            return transactions
+            transaction_table = state["table"]
+            if not transaction_table:
+                logger.info("ℹ️ No transaction table found")
+                return []
             
-        except Exception as e:
-            logger.error(f"Table extraction failed: {e}")
+            # One script returns every row's cell texts, instead of a round-trip per row and per cell
+            table_data = driver.execute_script(TABLE_ROWS_JS, transaction_table, from_date_key)
+        except JavascriptException as script_error:
+            # Scripts blocked (e.g. by CSP): parse one page_source snapshot locally instead
+            if HTMLParser is None:
+                raise
+            logger.warning(f"Table script failed ({script_error}), parsing page source instead")
+            table_data = _rows_from_page_source(driver, from_date_key)
+        
+        rows = table_data["rows"]
+        filtered_count = table_data["filtered"]
+        if not rows and not filtered_count:
             return []
         
+        return _transactions_from_rows(rows, filtered_count, from_date, from_date_dt, from_date_key)
+        
     except Exception as e:
         logger.error(f"Extraction failed: {e}")
         return []
 
-def fetch_transactions_v2(driver, from_date=None, max_pages=None):
+# Default cap on the rows one fetch_transactions_v2 call returns (0 = no cap), and how many
+# further pages one PAGINATED_ROWS_JS call reads, which bounds the rows held at once
+MAX_TRANSACTIONS = int(os.getenv("MB_MAX_TRANSACTIONS", "0"))
+PAGES_PER_SCRIPT = 10
+
+def iter_transactions(driver, from_date=None, max_pages=None):
+    """
+    Yield the transactions of an already queried inquiry page, page by page and filtered by
+    from_date. Further pages are read PAGES_PER_SCRIPT at a time, up to max_pages (default 1).
+    """
+    # Parsed once for the first page and every further one
+    from_date_dt, from_date_key = _parse_from_date(from_date)
+    yield from extract_transaction_data_from_table_optimized(
+        driver, from_date, parsed_from_date=(from_date_dt, from_date_key)
+    )
+    
+    # Handle pagination (with date filtering)
+    logger.info("Checking for pagination...")
+    remaining = max_pages if max_pages else 1  # Default limit
+    
+    # The browser clicks "next" and collects the rows itself, a batch of pages per round-trip.
+    # The longer script timeout is put back afterwards, pooled sessions outlive this crawl
+    previous_script_timeout = None
+    try:
+        while remaining > 0:
+            batch = min(remaining, PAGES_PER_SCRIPT)
+            try:
+                if previous_script_timeout is None:
+                    previous_script_timeout = driver.timeouts.script
+                driver.set_script_timeout(batch * PAGE_CHANGE_TIMEOUT + 5)
+                result = driver.execute_async_script(
+                    PAGINATED_ROWS_JS, from_date_key, batch, PAGE_CHANGE_TIMEOUT * 1000
+                )
+            except Exception as pagination_error:
+                logger.warning(f"Error during pagination: {pagination_error}")
+                return
+        
+            pages = result["pages"]
+            stopped = result["stopped"]
+            for page in pages:
+                yield from _transactions_from_rows(page["rows"], page["filtered"], from_date, from_date_dt, from_date_key)
+        
+            remaining -= len(pages)
+            if stopped != "max_pages":
+                if stopped != "last_page":
+                    logger.warning(f"Pagination stopped after {len(pages)} more page(s): {stopped}")
+                return
+    finally:
+        if previous_script_timeout is not None:
+            try:
+                driver.set_script_timeout(previous_script_timeout)
+            except Exception as e:
+                logger.warning(f"Could not restore the script timeout: {e}")
+
+def fetch_transactions_v2(driver, from_date=None, max_pages=None, max_transactions=None):
     """
     Updated fetch_transactions function that ALWAYS navigates to transaction page
-    but skips to_date input - only sets from_date
+    but skips to_date input - only sets from_date.
+    At most max_transactions rows are returned (MAX_TRANSACTIONS by default, 0 = no cap)
     """
     try:
         # Validate driver session first
@@ -1018,20 +1258,19 @@ def fetch_transactions_v2(driver, from_date=None, max_pages=None):
             }
         
         # FORCE NAVIGATION - ALWAYS go to transaction page fresh
-        transaction_url = 'https://ebank.mbbank.com.vn/cp/account-info/transaction-inquiry'
+        transaction_url = TRANSACTION_INQUIRY_URL
         driver.get(transaction_url)
         
         # ✅ FIX: Wait for loading overlay to disappear
         try:
             # Wait for loading indicator to disappear
-            WebDriverWait(driver, 10).until_not(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".loadingActivityIndicator"))
+            # MB hides the spinner with CSS rather than removing it, so check visibility, not presence
+            WebDriverWait(driver, 10, poll_frequency=0.1).until(
+                lambda d: d.execute_script(LOADING_DONE_JS)
             )
             logger.info("Loading overlay disappeared")
-        except:
-            # Fallback: just wait longer
-            time.sleep(2)
-            logger.info("Used fallback wait for page load")
+        except TimeoutException:
+            logger.warning("⚠️ Loading overlay still visible after 10s, continuing anyway")
     
         # Continue with date filters if from_date is provided
         if from_date:
@@ -1064,12 +1303,12 @@ def fetch_transactions_v2(driver, from_date=None, max_pages=None):
                 # Use the exact XPath from your working test.ipynb
                 # //*[@id="mat-radio-3"]/label/div[1]/div[1]
                 period_button = WebDriverWait(driver, 3).until(
-                    EC.element_to_be_clickable((By.XPATH, '//*[@id="mat-radio-3"]/label/div[1]/div[1]'))
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, PERIOD_RADIO_CSS))
                 )
                 
                 # period_button.click()  # Use the most reliable method
                 driver.execute_script("arguments[0].click();", period_button)
-                time.sleep(0.5)  # Wait for UI to respond
+                # No pause needed, the from_date wait below returns once the picker is usable
                 
             except Exception as e:
                 logger.error(f"Failed to select period option: {e}")
@@ -1078,18 +1317,11 @@ def fetch_transactions_v2(driver, from_date=None, max_pages=None):
             # Set from_date ONLY
             try:
                 from_date_field = WebDriverWait(driver, 3).until(
-                    EC.element_to_be_clickable((By.XPATH, '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/form/div/div/div/div[2]/div/div/div[2]/div[1]/div[1]/div/mbb-date-time-picker/input'))
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, FROM_DATE_INPUT_CSS))
                 )
                 
-                from_date_field.click()
-                
-                from_date_field.send_keys(Keys.CONTROL + 'a')  # Select all text
-                from_date_field.send_keys(Keys.BACKSPACE)  # Clear selected text
-                
-                
-                from_date_field.send_keys(formatted_from_date) #optimized
-                from_date_field.send_keys(Keys.TAB)
-                from_date_field.send_keys(Keys.ESCAPE)
+                # Set the value and fire input/change/blur in one call (no picker popup to dismiss)
+                driver.execute_script(SET_INPUT_VALUE_JS, from_date_field, formatted_from_date)
                 logger.info(f"Entered from_date: {formatted_from_date}")
                 
             except Exception as e:
@@ -1101,73 +1333,40 @@ def fetch_transactions_v2(driver, from_date=None, max_pages=None):
             # Click query button - Use exact XPath from test.ipynb
             try:
                 query_button = WebDriverWait(driver, 3).until(
-                    EC.element_to_be_clickable((By.XPATH, '//*[@id="btn-query"]'))
+                    EC.element_to_be_clickable((By.CSS_SELECTOR, QUERY_BUTTON_CSS))
                 )
+                # The page may already show a default-period table, remember its first row so the
+                # reader below can't pick up those stale rows
+                old_first_row = next(iter(driver.find_elements(By.CSS_SELECTOR, TABLE_FIRST_ROW_CSS)), None)
                 query_button.click()
                 # logger.info("Clicked query button")
                 
-                # Wait for results to load
-                time.sleep(0.5)
+                # Wait for results to load: the old rows are replaced, then the loading overlay clears
+                try:
+                    if old_first_row is not None:
+                        WebDriverWait(driver, 10, poll_frequency=0.1).until(EC.staleness_of(old_first_row))
+                    WebDriverWait(driver, 10, poll_frequency=0.1).until(
+                        lambda d: d.execute_script(LOADING_DONE_JS)
+                    )
+                except TimeoutException:
+                    logger.warning("⚠️ Query results not confirmed after 10s, reading the table anyway")
                 
             except Exception as e:
                 logger.error(f"Failed to click query button: {e}")
                 return None
         
-        # Extract account information and balance - TEMPORARILY DISABLED
-        # logger.info("Skipping account information extraction (temporarily disabled)")
-        account_info = {
-            "account_number": "",
-            "account_name": "",
-            "balance": "",
-            "currency": "VND",
-            "last_updated": datetime.now().strftime('%d-%m-%Y %H:%M:%S'),
-            "opening_balance": "0",
-            "closing_balance": "0",
-            "total_credit": "0",
-            "total_debit": "0"
-        }
+        # Extract account information and balance - placeholders unless EXTRACT_ACCOUNT_INFO is on
+        account_info = extract_account_info(driver)
         
-        # Extract transaction data using the corrected method with date filtering
+        # Pull transactions page by page, stopping early once the cap is reached
         logger.info("Extracting transaction data...")
-        all_transactions = extract_transaction_data_from_table_optimized(driver, from_date)
-        
-        # Handle pagination (keep existing pagination code with date filtering)
-        logger.info("Checking for pagination...")
-        page_num = 1
-        max_pages_to_process = max_pages if max_pages else 1  # Default limit
-        
-        while page_num <= max_pages_to_process:
-            try:
-                # Look for pagination controls
-                pagination_elements = driver.find_elements(By.XPATH, '//*[@id="page-items"]//button')
-                
-                if not pagination_elements:
-                    break
-                
-                # Check if there's a next page button (usually second-to-last element)
-                if len(pagination_elements) >= 2:
-                    next_button = pagination_elements[-2]  # Second last element
-                    
-                    # Check if next button is clickable by looking for the disabled attribute
-                    if next_button.get_attribute('disabled') is None:
-                        next_button.click()
-                        
-                        # Wait for page to load
-                        time.sleep(0.5)  # REDUCED: 1s → 0.5s
-                        
-                        # Extract transactions from new page WITH date filtering
-                        page_transactions = extract_transaction_data_from_table_optimized(driver, from_date)
-                        all_transactions.extend(page_transactions)
-                        
-                        page_num += 1
-                    else:
-                        break
-                else:
-                    break
-                    
-            except Exception as pagination_error:
-                logger.warning(f"Error during pagination on page {page_num}: {pagination_error}")
-                break
+        cap = MAX_TRANSACTIONS if max_transactions is None else max_transactions
+        transactions_iter = iter_transactions(driver, from_date, max_pages)
+        if cap:
+            transactions_iter = islice(transactions_iter, cap)
+        all_transactions = list(transactions_iter)
+        if cap and len(all_transactions) >= cap:
+            logger.warning(f"Reached the {cap} transaction cap, any later rows were not read")
         
         logger.info(f"Pagination complete. Total transactions after filtering: {len(all_transactions)}")
         
@@ -1187,4 +1386,4 @@ def fetch_transactions_v2(driver, from_date=None, max_pages=None):
             "count": 0,
             "transactions": [],
             "account_info": {"last_updated": datetime.now().strftime('%d-%m-%Y %H:%M:%S')}
-        }
\ No newline at end of file
+        }
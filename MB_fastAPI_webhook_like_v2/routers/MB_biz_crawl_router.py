@@ -4,16 +4,17 @@ import logging
 import base64
 import json
 import sys
-import subprocess
-from datetime import datetime, timedelta
-import pytz  # Added import for timezone support
+from datetime import datetime, timedelta, timezone
 import asyncio
 import random
 import socket
+import hashlib
+import threading
 from typing import Optional, Dict, Any
 import httpx
 import re
 from pathlib import Path  # Added import for Path
+from functools import lru_cache
 
 # This router supports detailed datetime filtering with minute precision
 # You can pass dates in DD/MM/YYYY format (will use 00:00/23:59 as default times)
@@ -37,7 +38,7 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException,
 from routers.captcha_reading import read_captcha
 from routers.clear_tmp_file import cleanup_png_files
 
-from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi import APIRouter, HTTPException, Query, Body, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
@@ -45,10 +46,13 @@ from pydantic import BaseModel
 logger = logging.getLogger(__name__)
 # atexit.register(cleanup_png_files)
 
+# Vietnam has no DST, a fixed +7 offset is all the timezone handling needed
+_GMT7 = timezone(timedelta(hours=7))
+_DEFAULT_FMT = "%Y-%m-%d %H:%M:%S"
+
 class GMT7Formatter(logging.Formatter):
     def formatTime(self, record, datefmt=None):
-        gmt7_time = time.localtime(record.created + 7 * 3600)
-        return time.strftime(datefmt or "%Y-%m-%d %H:%M:%S", gmt7_time)
+        return datetime.fromtimestamp(record.created, _GMT7).strftime(datefmt or _DEFAULT_FMT)
 
 
 console_handler = logging.StreamHandler(sys.stdout)
@@ -57,10 +61,34 @@ formatter = GMT7Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 console_handler.setFormatter(formatter)
 logger.addHandler(console_handler)
 logger.setLevel(logging.INFO)
+# Has its own GMT+7 handler, don't print every line a second time through the root logger
+logger.propagate = False
 
 router = APIRouter()
 
-# Check if we're running in Docker or locally
+# Patterns used on every request / transaction row, compiled once
+_FT_RE = re.compile(r'^FT\d{14,}$')  # valid SỐ BÚT TOÁN
+_BALANCE_RE = re.compile(r'([\d,\.]+)\s*([A-Za-z]+)?')  # "736,199,827  VND"
+_DATE_RE = re.compile(r'^(\d{2}/\d{2}/\d{4})( \d{2}:\d{2})?$')  # DD/MM/YYYY or DD/MM/YYYY HH:MM
+_NBSP_TAB = str.maketrans({"\u00a0": " "})  # non-breaking spaces from the balance cell -> plain spaces
+_NUM_STRIP = str.maketrans("", "", ",.")  # thousands separators dropped in one pass
+
+def _parse_dt(value: str) -> datetime:
+    """Parse DD/MM/YYYY HH:MM or DD/MM/YYYY in one step, ValueError if it isn't a real date"""
+    for fmt in ("%d/%m/%Y %H:%M", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"Invalid date: {value}")
+
+# Environment read once at import, it does not change while the process runs
+_DOCKER_ENV = os.environ.get('DOCKER_CONTAINER', '') == 'true' or os.environ.get('IS_DOCKER', '') == 'true'
+_SELENIUM_HOST = os.environ.get('SELENIUM_HOST', '')
+_MB_MAX_ATTEMPTS = int(os.getenv("MB_LOGIN_MAX_ATTEMPTS", "3"))  # Default to 3 attempts if not set
+
+# Check if we're running in Docker or locally (can't change while the process runs, so cached)
+@lru_cache(maxsize=1)
 def is_docker():
     """Check if we're running in a Docker container using multiple methods"""
     # Method 1: Check cgroup file
@@ -79,13 +107,12 @@ def is_docker():
         return True
         
     # Method 3: Check environment variables
-    if os.environ.get('DOCKER_CONTAINER', '') == 'true' or os.environ.get('IS_DOCKER', '') == 'true':
+    if _DOCKER_ENV:
         logger.info("Docker detected via environment variables")
         return True
         
     # Method 4: Check hostname
     try:
-        import socket
         if 'docker' in socket.gethostname():
             logger.info("Docker detected via hostname")
             return True
@@ -93,7 +120,7 @@ def is_docker():
         pass
         
     # If SELENIUM_HOST is set to selenium-hub, assume we're in Docker
-    if os.environ.get('SELENIUM_HOST', '') == 'selenium-hub':
+    if _SELENIUM_HOST == 'selenium-hub':
         logger.info("Docker detected via SELENIUM_HOST environment variable")
         return True
     
@@ -107,29 +134,34 @@ def get_selenium_hub_url():
     # In Docker environment, always use the internal container name
     return "http://selenium-hub:4444/wd/hub"
 
+# Hub status checks share one keep-alive client, and a result is trusted for a few seconds
+_HUB_STATUS_URL = "http://selenium-hub:4444/status"
+_HUB_CLIENT = httpx.Client(timeout=2.0)
+_HUB_STATUS_TTL = 5.0
+_hub_status = (0.0, False)  # (checked_at, available)
+
 # Add a simple connection test function
 def test_selenium_hub_connection():
     """Test direct connection to Selenium hub without WebDriver"""
+    global _hub_status
+    checked_at, available = _hub_status
+    if time.monotonic() - checked_at < _HUB_STATUS_TTL:
+        return available
     try:
-        # Use subprocess for a simple connection test that doesn't depend on async
-        import subprocess
-        result = subprocess.run(
-            ["curl", "-s", "http://selenium-hub:4444/status"], 
-            capture_output=True, 
-            text=True, 
-            timeout=5
-        )
-        if result.returncode == 0 and "ready" in result.stdout:
-            logger.info("Selenium Grid is available (direct curl test)")
-            return True
+        response = _HUB_CLIENT.get(_HUB_STATUS_URL)
+        available = response.status_code == 200 and "ready" in response.text
+        if available:
+            logger.info("Selenium Grid is available (status check)")
         else:
-            logger.error(f"Selenium Grid connection test failed: {result.returncode}")
-            return False
+            logger.error(f"Selenium Grid connection test failed: {response.status_code}")
     except Exception as e:
         logger.error(f"Error testing Selenium Grid connection: {e}")
-        return False
+        available = False
+    _hub_status = (time.monotonic(), available)
+    return available
 
-# Add a new helper function to find the data directory
+# Add a new helper function to find the data directory (looked up/created once per process)
+@lru_cache(maxsize=1)
 def find_data_directory():
     """Find the data directory using multiple approaches to handle different environments."""
     possible_paths = [
@@ -158,12 +190,11 @@ def parse_balance_field(balance_str):
     Parse a balance string like '736,199,827  VND' to a dict with value and currency.
     Returns: {"value": 736199827, "currency": "VND"}
     """
-    import re
     if not isinstance(balance_str, str):
         return {"value": None, "currency": None}
-    match = re.match(r"([\d,\.]+)\s*([A-Za-z]+)?", balance_str.replace("\u00a0", " ").strip())
+    match = _BALANCE_RE.match(balance_str.translate(_NBSP_TAB).strip())
     if match:
-        num_str = match.group(1).replace(",", "").replace(".", "")
+        num_str = match.group(1).translate(_NUM_STRIP)
         try:
             value = int(num_str)
         except Exception:
@@ -177,9 +208,8 @@ def is_valid_transaction(transaction: Dict[str, Any]) -> bool:
     Validate a transaction to ensure it contains meaningful data.
     """
     # Check if 'SỐ BÚT TOÁN' exists and matches a valid pattern
-    valid_so_but_toan_pattern = r'^FT\d{14,}$'
     so_but_toan = transaction.get("SỐ BÚT TOÁN", "").strip()
-    if not so_but_toan or not re.match(valid_so_but_toan_pattern, so_but_toan):
+    if not so_but_toan or not _FT_RE.match(so_but_toan):
         return False
 
     # Check if 'ĐƠN VỊ THỤ HƯỞNG/ĐƠN VỊ CHUYỂN' is not empty
@@ -190,15 +220,135 @@ def is_valid_transaction(transaction: Dict[str, Any]) -> bool:
     # Additional checks can be added here if needed
     return True
 
+# Raw table columns that never reach the response
+_UNWANTED = frozenset(("CN", "T2", "T3", "T4", "T5", "T6", "T7"))
+
 def clean_transaction_fields(transaction: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Remove unnecessary fields from a transaction dictionary.
+    Remove unnecessary fields from a transaction dictionary, in place (callers pass freshly scraped dicts).
     """
-    fields_to_remove = ["CN", "T2", "T3", "T4", "T5", "T6", "T7"]
-    return {key: value for key, value in transaction.items() if key not in fields_to_remove}
+    for key in _UNWANTED:
+        transaction.pop(key, None)
+    return transaction
+
+# Login page locators, each a single XPath union so one find_elements call covers every variant
+# Leftover popup from a previous attempt ("Đóng" is Vietnamese "Close")
+LEFTOVER_POPUP_CLOSE_XPATH = (
+    "//button[contains(text(), 'Close')] | //button[contains(text(), 'Đóng')] | //button[contains(@class, 'close')]"
+)
+# Welcome dialog shown after the login page loads
+WELCOME_POPUP_CLOSE_XPATH = (
+    '//*[@id="mat-dialog-0"]/mbb-dialog-common/div/div[4]/button'
+    " | //button[contains(@class, 'close')] | //button[contains(@class, 'btn-close')]"
+)
+# Captcha image in any known layout, never the widget's reload icon
+CAPTCHA_IMG_XPATH = (
+    "//mbb-word-captcha//img[not(@alt='reload')] | //img[contains(@src, 'captcha')]"
+    " | //div[contains(@class, 'captcha')]//img[not(@alt='reload')]"
+)
+# Async: base64 bytes of the captcha <img> passed as arguments[0]. A data URL's body is returned as-is,
+# any other source is redrawn on a canvas and returned as PNG. Calls back with null if it can't be read
+CAPTCHA_IMAGE_B64_JS = """
+    const img = arguments[0];
+    const done = arguments[arguments.length - 1];
+    const src = img.currentSrc || img.src || "";
+    if (src.startsWith("data:image") && src.includes(";base64,")) {
+        done(src.slice(src.indexOf(",") + 1));
+        return;
+    }
+    const draw = () => {
+        try {
+            const canvas = document.createElement("canvas");
+            canvas.width = img.naturalWidth;
+            canvas.height = img.naturalHeight;
+            canvas.getContext("2d").drawImage(img, 0, 0);
+            done(canvas.toDataURL("image/png").split(",")[1]);
+        } catch (e) {
+            done(null);  // e.g. a cross-origin image taints the canvas
+        }
+    };
+    if (img.complete && img.naturalWidth) {
+        draw();
+    } else {
+        img.addEventListener("load", draw, {once: true});
+        img.addEventListener("error", () => done(null), {once: true});
+    }
+"""
+# Clicks the captcha's reload control and returns the current image src (to wait for a change),
+# or null when the control or image is missing
+CAPTCHA_REFRESH_JS = """
+    const img = document.querySelector("mbb-word-captcha img:not([alt='reload'])");
+    const button = document.querySelector("mbb-word-captcha .refresh, mbb-word-captcha img[alt='reload']");
+    if (!img || !button) return null;
+    button.click();
+    return img.src;
+"""
+CAPTCHA_SRC_JS = "const img = document.querySelector(\"mbb-word-captcha img:not([alt='reload'])\"); return img ? img.src : null;"
+# In-place captcha refreshes in a row before a GW715 retry falls back to a full page load
+MAX_IN_PLACE_CAPTCHA_RETRIES = 2
+# Login error text, whichever mat-dialog-N hosts the mbb-dialog-error (plus a generic fallback)
+ERROR_DIALOG_XPATH = "//mbb-dialog-error//p | //div[contains(@class, 'error')]//p"
+
+# Present once the login error dialog has rendered its message (the sign-in outcome wait stops here)
+LOGIN_ERROR_SHOWN_XPATH = "//mbb-dialog-error//p"
+
+# Evaluates each XPath in page and returns {xpath, text} for the first visible node with text, or null.
+# One round-trip instead of find_elements + is_displayed + text per candidate
+ERROR_TEXT_JS = """
+    for (const xpath of arguments[0]) {
+        const snap = document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (let i = 0; i < snap.snapshotLength; i++) {
+            const el = snap.snapshotItem(i);
+            const text = (el.innerText || el.textContent || '').trim();
+            if (text && el.getClientRects().length) return {xpath: xpath, text: text};
+        }
+    }
+    return null;
+"""
+
+# Sets each input (by element id) and fires input/change so Angular's form model picks the value up.
+# Returns the id of the first missing field, or null when everything was filled
+FILL_CREDENTIALS_JS = """
+    const values = arguments[0];
+    for (const id of Object.keys(values)) {
+        if (!document.getElementById(id)) return id;
+    }
+    for (const [id, value] of Object.entries(values)) {
+        const el = document.getElementById(id);
+        el.focus();
+        el.value = value;
+        el.dispatchEvent(new Event("input", {bubbles: true}));
+        el.dispatchEvent(new Event("change", {bubbles: true}));
+        el.dispatchEvent(new Event("blur"));
+    }
+    return null;
+"""
+
+# Replace an input's value the way typing would, so the form control sees it
+SET_INPUT_VALUE_JS = """
+    const el = arguments[0];
+    el.value = arguments[1];
+    el.dispatchEvent(new Event("input", {bubbles: true}));
+    el.dispatchEvent(new Event("change", {bubbles: true}));
+"""
 
 # keep trying if wrong captcha
 # stop if wrong corp_id, username or password 1 time
+def _refresh_captcha(driver):
+    """Regenerate the captcha without reloading the login page, True once a new image is in"""
+    try:
+        old_src = driver.execute_script(CAPTCHA_REFRESH_JS)
+        if old_src is None:
+            return False
+        WebDriverWait(driver, 3, poll_frequency=0.2).until(
+            lambda d: d.execute_script(CAPTCHA_SRC_JS) not in (None, old_src)
+        )
+        logger.info("🔄 Captcha refreshed in place")
+        return True
+    except Exception as e:
+        logger.warning(f"⚠️ Could not refresh captcha in place, reloading login page: {e}")
+        return False
+
 def log_in_v2(driver, username: str, password: str, corp_id: str):
     """
     Intelligent login function for MB Business Banking:
@@ -206,95 +356,66 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
     - Stop immediately if wrong credentials or account locked (other error codes)
     """
     
-    max_attempts = int(os.getenv("MB_LOGIN_MAX_ATTEMPTS", "3"))  # Default to 3 attempts if not set
+    max_attempts = _MB_MAX_ATTEMPTS
     logger.info(f"🔐 Starting intelligent login process (max {max_attempts} attempts)")
     
+    # After a GW715 the page is still on the login form, so only the captcha needs regenerating
+    reload_page = True
+    in_place_retries = 0
+    
     for attempt in range(max_attempts):
         logger.info(f"Attempting to log in, attempt {attempt + 1}/{max_attempts}")
         
-        # Close any popup that might be open from previous failed attempt
-        try:
-            close_button_xpaths = [
-                "//button[contains(text(), 'Close')]",
-                "//button[contains(text(), 'Đóng')]",  # Vietnamese "Close"
-                "//button[contains(@class, 'close')]"
-            ]
-            
-            for xpath in close_button_xpaths:
-                try:
-                    close_buttons = driver.find_elements(By.XPATH, xpath)
-                    if close_buttons:
-                        for button in close_buttons:
-                            if button.is_displayed():
-                                logger.info("Closing popup...")
-                                button.click()
-                                time.sleep(0.5)
-                                break
-                except:
-                    continue
-        except:
-            pass
-                
-        # Navigate to the login page
-        url = 'https://ebank.mbbank.com.vn/cp/pl/login'
-        logger.info(f"Navigating to: {url}")
-        driver.get(url)
+        if not reload_page:
+            in_place_retries += 1
+            if not _refresh_captcha(driver):
+                reload_page = True
         
-        # OPTIMIZED: Faster popup clearing with shorter timeouts
-        try:
-            close_button_xpaths = [
-                '//*[@id="mat-dialog-0"]/mbb-dialog-common/div/div[4]/button',
-                "//button[contains(@class, 'close')]",
-                "//button[contains(@class, 'btn-close')]"
-            ]
+        if reload_page:
+            in_place_retries = 0
             
-            for xpath in close_button_xpaths:
-                try:
-                    WebDriverWait(driver, 1.5).until(EC.presence_of_element_located((By.XPATH, xpath)))
-                    close_buttons = driver.find_elements(By.XPATH, xpath)
-                    if close_buttons:
-                        for button in close_buttons:
-                            if button.is_displayed():
-                                logger.info(f"Closing initial popup using {xpath}...")
-                                button.click()
-                                time.sleep(0.3)
-                                break
-                except:
-                    continue
-        except Exception as popup_error:
-            pass
+            # Close any popup that might be open from previous failed attempt (one query for all variants)
+            try:
+                for button in driver.find_elements(By.XPATH, LEFTOVER_POPUP_CLOSE_XPATH):
+                    if button.is_displayed():
+                        logger.info("Closing popup...")
+                        button.click()
+                        time.sleep(0.5)
+                        break
+            except:
+                pass
                     
-        # Page load wait
-        time.sleep(0.5)
+            # Navigate to the login page
+            url = 'https://ebank.mbbank.com.vn/cp/pl/login'
+            logger.info(f"Navigating to: {url}")
+            driver.get(url)
+            
+            # Close the welcome popup if there is one: one query, no waiting (usually there is none)
+            try:
+                for button in driver.find_elements(By.XPATH, WELCOME_POPUP_CLOSE_XPATH):
+                    if button.is_displayed():
+                        logger.info("Closing initial popup...")
+                        button.click()
+                        time.sleep(0.3)
+                        break
+            except Exception as popup_error:
+                pass
+        reload_page = True
         
         current_url = driver.current_url
         logger.info(f"Current URL after navigation: {current_url}")
         
-        # OPTIMIZED: Faster captcha detection with prioritized selectors
+        # Captcha image: one wait on a union that covers every known layout
         captcha_img = None
-        captcha_locating_methods = [
-            {"method": "xpath", "selector": '//*[@id="main-content"]/mbb-welcome/div/div/div[2]/div[2]/div/mbb-login/form/div/div[2]/mbb-word-captcha/div/div[2]/div/div/img'},
-            {"method": "xpath", "selector": '//*[@id="main-content"]/mbb-welcome/div/div/div[2]/div[2]/div/mbb-login/form/div/div[2]/mbb-word-captcha/div/div[2]/div[1]/div/img'},
-            {"method": "xpath", "selector": "//mbb-word-captcha//img"},
-            {"method": "xpath", "selector": "//img[contains(@src, 'captcha')]"},
-            {"method": "xpath", "selector": "//div[contains(@class, 'captcha')]//img"}
-        ]
-                
         captcha_found = False
-        for method in captcha_locating_methods:
-            try:
-                if method['method'] == 'xpath':
-                    try:
-                        captcha_img = WebDriverWait(driver, 3).until(
-                            EC.presence_of_element_located((By.XPATH, method['selector']))
-                        )
-                        logger.info(f"Captcha found with XPath: {method['selector']}")
-                        captcha_found = True
-                        break
-                    except TimeoutException:
-                        continue
-            except Exception as e:
-                continue
+        try:
+            captcha_img = WebDriverWait(driver, 3).until(
+                EC.presence_of_element_located((By.XPATH, CAPTCHA_IMG_XPATH))
+            )
+            logger.info("Captcha found")
+            captcha_found = True
+        except TimeoutException:
+            pass
                 
         if not captcha_found:
             logger.error("Could not find captcha with any method")
@@ -303,25 +424,24 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
                 return False
             continue
         
-        # Get image source and process captcha
-        img_src = captcha_img.get_attribute("src")
-        if not img_src:
-            logger.error("Error: Could not get captcha image source")
+        # Get the captcha image bytes (base64) in one round-trip, data URL or not
+        try:
+            captcha_b64 = driver.execute_async_script(CAPTCHA_IMAGE_B64_JS, captcha_img)
+        except Exception as e:
+            logger.error(f"Error reading captcha image: {e}")
+            captcha_b64 = None
+        if not captcha_b64:
+            logger.error("Error: Could not get captcha image")
             continue
         
         # Process captcha
         captcha_text = ""
-        if img_src.startswith("data:image"):
-            try:
-                img_data = img_src.split(",")[1]
-                img_bytes = base64.b64decode(img_data)
-                captcha_text = read_captcha(img_bytes, is_bytes=True, save_images=True).replace(" ", "")
-                logger.info(f"Captcha read as: {captcha_text}")
-            except Exception as e:
-                logger.error(f"Error processing captcha: {e}")
-                continue
-        else:
-            logger.error("Captcha image is not a data URL")
+        try:
+            img_bytes = base64.b64decode(captcha_b64)
+            captcha_text = read_captcha(img_bytes, is_bytes=True, save_images=True).replace(" ", "")
+            logger.info(f"Captcha read as: {captcha_text}")
+        except Exception as e:
+            logger.error(f"Error processing captcha: {e}")
             continue
 
         # Form filling
@@ -331,27 +451,14 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
             WebDriverWait(driver, 8).until(
                 EC.element_to_be_clickable((By.XPATH, corp_id_xpath))
             )
-            corp_id_field = driver.find_element(By.XPATH, corp_id_xpath)
-            corp_id_field.clear()
-            corp_id_field.send_keys(corp_id)
-            logger.info("Corp ID field filled")
-            time.sleep(0.5)
-            
-            # Username field
-            username_xpath = '//*[@id="user-id"]'
-            username_field = driver.find_element(By.XPATH, username_xpath)
-            username_field.clear()
-            username_field.send_keys(username)
-            logger.info("Username field filled")
-            time.sleep(0.5)
             
-            # Password field
-            password_xpath = '//*[@id="password"]'
-            password_field = driver.find_element(By.XPATH, password_xpath)
-            password_field.clear()
-            password_field.send_keys(password)
-            logger.info("Password field filled")
-            time.sleep(0.5)
+            # Corp ID, username and password in one round-trip, no typing or pauses
+            missing_field = driver.execute_script(
+                FILL_CREDENTIALS_JS, {"corp-id": corp_id, "user-id": username, "password": password}
+            )
+            if missing_field:
+                raise Exception(f"Login field not found: {missing_field}")
+            logger.info("Corp ID, username and password fields filled")
             
             # Captcha input
             captcha_input_xpath = '//*[@id="main-content"]/mbb-welcome/div/div/div[2]/div[2]/div/mbb-login/form/div/div[2]/mbb-word-captcha/div/div[2]/div[1]/input'
@@ -359,15 +466,11 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
                 captcha_field = WebDriverWait(driver, 2).until(
                     EC.element_to_be_clickable((By.XPATH, captcha_input_xpath))
                 )
-                captcha_field.clear()
-                for char in captcha_text:
-                    captcha_field.send_keys(char)
-                    time.sleep(0.05)
-                logger.info("Captcha field filled")
             except Exception as e:
                 raise Exception("Captcha input field not found")
-            
-            time.sleep(0.3)
+            # Whole captcha in one assignment, the input event runs the form validation
+            driver.execute_script(SET_INPUT_VALUE_JS, captcha_field, captcha_text)
+            logger.info("Captcha field filled")
             
             # Sign-in button click
             signin_button_xpath = '//*[@id="login-btn"]'
@@ -385,8 +488,14 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
             
             logger.info("Logging in, please wait...")
             
-            # ✅ SIMPLIFIED: Wait 2 seconds then check login success
-            time.sleep(2)  # Wait for login process
+            # Wait until the page either leaves the login form or shows the error dialog, then check
+            try:
+                WebDriverWait(driver, 10, poll_frequency=0.1).until(
+                    lambda d: ("/cp/" in d.current_url and "login" not in d.current_url)
+                    or d.find_elements(By.XPATH, LOGIN_ERROR_SHOWN_XPATH)
+                )
+            except TimeoutException:
+                logger.warning("⚠️ Login outcome not visible after 10s, checking page state anyway")
             
             try:
                 current_url = driver.current_url
@@ -406,28 +515,15 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
                 else:
                     # ✅ INTELLIGENT ERROR DETECTION
                     try:
-                        # Look for error dialog - try multiple XPaths for robustness
-                        error_dialog_xpaths = [
-                            '//*[@id="mat-dialog-0"]/mbb-dialog-error/div/div[1]/div[2]/b/p',
-                            '//*[@id="mat-dialog-1"]/mbb-dialog-error/div/div[1]/div[2]/b/p',
-                            '//*[@id="mat-dialog-2"]/mbb-dialog-error/div/div[1]/div[2]/b/p',
-                            '//*[@id="mat-dialog-3"]/mbb-dialog-error/div/div[1]/div[2]/b/p',
-                            "//mbb-dialog-error//p",
-                            "//div[contains(@class, 'error')]//p"
-                        ]
-                        
-                        error_message = None
-                        for xpath in error_dialog_xpaths:
-                            try:
-                                error_element = driver.find_element(By.XPATH, xpath)
-                                if error_element.is_displayed() and error_element.text.strip():
-                                    error_message = error_element
-                                    break
-                            except:
-                                continue
+                        # Look for error dialog - one query covers every mat-dialog-N and the class-based fallback
+                        error_hit = None
+                        try:
+                            error_hit = driver.execute_script(ERROR_TEXT_JS, [ERROR_DIALOG_XPATH])
+                        except Exception:
+                            pass
                         
-                        if error_message:
-                            error_text = error_message.text.strip()
+                        if error_hit:
+                            error_text = error_hit["text"]
                             logger.info(f"Error message detected: {error_text}")
                             
                             # ✅ DECISION LOGIC: GW715 vs Credential Errors
@@ -443,6 +539,8 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
                                 except:
                                     pass
                                 
+                                # Still on the login form: refresh just the captcha, unless that already failed to help twice
+                                reload_page = in_place_retries >= MAX_IN_PLACE_CAPTCHA_RETRIES
                                 continue  # Retry with next attempt
                                 
                             elif 'GW18' in error_text:
@@ -496,14 +594,69 @@ def log_in_v2(driver, username: str, password: str, corp_id: str):
     logger.error(f"❌ All {max_attempts} login attempts failed")
     return False
 
+# Logged-in grid sessions parked between requests, keyed by account. The password is hashed into
+# the key, so a request with a wrong password never gets a session someone else logged in
+BIZ_SESSIONS_PER_ACCOUNT = int(os.getenv("MB_BIZ_SESSIONS_PER_ACCOUNT", "1"))
+_parked_sessions = {}
+_parked_lock = threading.Lock()
+
+def _account_key(corp_id: str, username: str, password: str):
+    return (corp_id, username, hashlib.sha256(password.encode("utf-8")).hexdigest())
+
+def _checkout_biz_session(pool, account):
+    """
+    Take this account's parked logged-in session if there is one, else a fresh pooled session.
+    Returns (driver, logged_in), driver is None when the pool has nothing to give.
+    """
+    with _parked_lock:
+        parked = _parked_sessions.get(account)
+        driver = parked.pop() if parked else None
+    if driver is not None:
+        revived = pool.revive(driver)
+        if revived is not None:
+            # A replaced (dead or worn-out) session comes back as a new, logged-out browser
+            return revived, revived is driver
+    
+    driver = pool.checkout(timeout=0.5)
+    if driver is None:
+        # Every session may be parked for other accounts, hand one of those back first
+        with _parked_lock:
+            victim = next((sessions.pop() for sessions in _parked_sessions.values() if sessions), None)
+        if victim is not None:
+            pool.checkin(victim)
+        driver = pool.checkout()
+    return driver, False
+
+def _release_biz_session(pool, account, driver):
+    """Park a still logged-in session for the account's next request, else give it back to the pool"""
+    try:
+        current_url = driver.current_url
+        logged_in = "/cp/" in current_url and "login" not in current_url
+    except Exception:
+        logged_in = False
+    if logged_in:
+        with _parked_lock:
+            has_room = len(_parked_sessions.get(account, ())) < BIZ_SESSIONS_PER_ACCOUNT
+        if has_room:
+            # Parked sessions skip checkin(), so the pool counts the use and applies its recycle policy here
+            if not pool.keep(driver):
+                return  # worn out, the pool already swapped it for a fresh session
+            with _parked_lock:
+                sessions = _parked_sessions.setdefault(account, [])
+                if len(sessions) < BIZ_SESSIONS_PER_ACCOUNT:
+                    sessions.append(driver)
+                    return
+    pool.checkin(driver)
+
 # ✅ UPDATED: Fixed mb_biz_login_v2 router to properly use log_in_v2
 @router.get('/MB_biz_transaction_crawling_v2', tags=['MB'])
 async def mb_biz_login_v2(
+    request: Request,
     corp_id: str = Query(..., description="MB business corporation ID"),
     username: str = Query(..., description="MB business username"),
     password: str = Query(..., description="MB business password"),
     fetch_transactions: bool = Query(False, description="Decide to retrieve transactions data or not"),
-    use_selenium_grid: bool = Query(False, description="Use Selenium Grid instead of local WebDriver"),
+    use_selenium_grid: bool = Query(False, description="Use Selenium Grid (pooled, logged-in sessions reused per account) instead of local WebDriver"),
     max_pages: Optional[int] = Query(1, description="Maximum number of transaction history pages to retrieve (null to retrieve all)"),
     from_date: Optional[str] = Query(None, description="Start date for transaction query (format: DD/MM/YYYY or DD/MM/YYYY HH:MM)"),
     to_date: Optional[str] = Query(None, description="End date for transaction query (format: DD/MM/YYYY or DD/MM/YYYY HH:MM)"),
@@ -517,19 +670,11 @@ async def mb_biz_login_v2(
         if from_date is not None:
             try:
                 # Validate date format DD/MM/YYYY or DD/MM/YYYY HH:MM
-                date_time_pattern = r'^(\d{2}/\d{2}/\d{4})( \d{2}:\d{2})?$'
-                if not re.match(date_time_pattern, from_date):
+                if not _DATE_RE.match(from_date):
                     return await generate_error_response("Invalid from_date format. Please use DD/MM/YYYY or DD/MM/YYYY HH:MM format.")
                 
-                # Parse date or date+time
-                if ' ' in from_date:
-                    date_part, time_part = from_date.split(' ')
-                    day, month, year = map(int, date_part.split('/'))
-                    hour, minute = map(int, time_part.split(':'))
-                    datetime(year, month, day, hour, minute)  # Validate the datetime
-                else:
-                    day, month, year = map(int, from_date.split('/'))
-                    datetime(year, month, day)  # Validate the date
+                # Parse date or date+time, raises ValueError for impossible dates
+                _parse_dt(from_date)
                 
                 logger.info(f"Valid from_date provided: {from_date}")
                 date_validation_passed = True
@@ -540,19 +685,11 @@ async def mb_biz_login_v2(
         if to_date is not None:
             try:
                 # Validate date format DD/MM/YYYY or DD/MM/YYYY HH:MM
-                date_time_pattern = r'^(\d{2}/\d{2}/\d{4})( \d{2}:\d{2})?$'
-                if not re.match(date_time_pattern, to_date):
+                if not _DATE_RE.match(to_date):
                     return await generate_error_response("Invalid to_date format. Please use DD/MM/YYYY or DD/MM/YYYY HH:MM format.")
                 
-                # Parse date or date+time
-                if ' ' in to_date:
-                    date_part, time_part = to_date.split(' ')
-                    day, month, year = map(int, date_part.split('/'))
-                    hour, minute = map(int, time_part.split(':'))
-                    datetime(year, month, day, hour, minute)  # Validate the datetime
-                else:
-                    day, month, year = map(int, to_date.split('/'))
-                    datetime(year, month, day)  # Validate the date
+                # Parse date or date+time, raises ValueError for impossible dates
+                _parse_dt(to_date)
                 
                 logger.info(f"Valid to_date provided: {to_date}")
                 date_validation_passed = True
@@ -570,607 +707,368 @@ async def mb_biz_login_v2(
             logger.info("Valid date range provided. Setting max_pages to None to retrieve all pages.")
             max_pages = None
         
-        # Try to scrape real data using Selenium
-        driver = None
-        try:
-            logger.info("Initializing Selenium WebDriver...")
+        # Selenium blocks for the whole crawl, run it in a worker thread so the event loop keeps serving
+        return await asyncio.to_thread(
+            _crawl_sync, request.app.state.driver_pool, corp_id, username, password, fetch_transactions,
+            use_selenium_grid, max_pages, from_date, to_date, date_validation_passed, save_json
+        )
             
-            # Initialize WebDriver (grid or local)
-            if use_selenium_grid:
-                # Test connection directly using curl
-                grid_available = test_selenium_hub_connection()
-                
-                if grid_available:
-                    selenium_grid_url = get_selenium_hub_url()
-                    logger.info(f"Initializing Remote WebDriver with Selenium Grid at: {selenium_grid_url}")
-                    
-                    try:
-                        options = webdriver.EdgeOptions()
-                        options.add_argument("--start-maximized")
-                        options.add_argument("--disable-notifications")
-                        options.add_argument("--headless")  # Run in headless mode
-                        
-                        # Add these options to help with access denied issues
-                        options.add_argument("--no-sandbox")
-                        options.add_argument("--disable-dev-shm-usage")
-                        options.add_argument("--disable-blink-features=AutomationControlled")
-                        options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.71 Safari/537.36 Edg/97.0.1072.62")
-                        
-                        # Set up capabilities with more detailed configuration
-                        options.set_capability("browserName", "MicrosoftEdge")
-                        options.set_capability("platformName", "linux")
-                        
-                        # Add HTTP client configuration with higher timeouts
-                        options.set_capability("se:options", {
-                            "timeouts": {"implicit": 15000, "pageLoad": 30000, "script": 30000}
-                        })
-                        
-                        # Use direct connection to Selenium Grid
-                        driver = webdriver.Remote(
-                            command_executor=selenium_grid_url,
-                            options=options,
-                            keep_alive=True
-                        )
-                        logger.info("Successfully connected to Selenium Grid")
-                    except Exception as grid_error:
-                        logger.error(f"Error connecting to Selenium Grid: {grid_error}")
-                        logger.info("Falling back to local WebDriver")
-                        use_selenium_grid = False
-                else:
-                    logger.warning("Selenium Grid is not available. Falling back to local WebDriver")
-                    use_selenium_grid = False
+    except Exception as e:
+        logger.error(f"Unexpected error: {e}", exc_info=True)
+        return await generate_error_response(f"An unexpected error occurred: {str(e)}", save_json=save_json)
+    
+def _crawl_sync(pool, corp_id: str, username: str, password: str, fetch_transactions: bool,
+                use_selenium_grid: bool, max_pages: Optional[int], from_date: Optional[str],
+                to_date: Optional[str], date_validation_passed: bool, save_json: bool) -> JSONResponse:
+    """Log in and crawl with Selenium. Blocking from start to end, mb_biz_login_v2 runs it in a worker thread"""
+    # Try to scrape real data using Selenium
+    driver = None
+    account = _account_key(corp_id, username, password)
+    reused_session = False
+    try:
+        logger.info("Initializing Selenium WebDriver...")
+        
+        # Initialize WebDriver (grid or local)
+        if use_selenium_grid and not test_selenium_hub_connection():
+            logger.warning("Selenium Grid is not available. Falling back to local WebDriver")
+            use_selenium_grid = False
+        if use_selenium_grid:
+            # Pooled grid session, already logged in when this account's last request left one parked
+            driver, reused_session = _checkout_biz_session(pool, account)
+            if driver is not None:
+                logger.info("Using pooled Selenium Grid session" + (" (already logged in)" if reused_session else ""))
+            else:
+                logger.warning("No pooled Selenium Grid session available. Falling back to local WebDriver")
+                use_selenium_grid = False
+        
+        # If not using grid (or grid failed), use local WebDriver
+        if not use_selenium_grid:
+            # Use local Edge WebDriver
+            logger.info("Using local Edge WebDriver")
+            edge_options = EdgeOptions()
+            edge_options.add_argument("--start-maximized")
+            edge_options.add_argument("--disable-notifications")
+            # Don't use headless mode initially to diagnose issues
+            # edge_options.add_argument("--headless")
             
-            # If not using grid (or grid failed), use local WebDriver
-            if not use_selenium_grid:
-                # Use local Edge WebDriver
-                logger.info("Using local Edge WebDriver")
-                edge_options = EdgeOptions()
-                edge_options.add_argument("--start-maximized")
-                edge_options.add_argument("--disable-notifications")
-                # Don't use headless mode initially to diagnose issues
-                # edge_options.add_argument("--headless")
-                
-                # Add extra options to help with detection issues
-                edge_options.add_argument("--disable-blink-features=AutomationControlled")
-                edge_options.add_argument("--disable-extensions")
-                edge_options.add_argument("--disable-gpu")
-                edge_options.add_argument("--no-sandbox")
-                
-                # Add flag to fix WebGL warnings
-                edge_options.add_argument("--enable-unsafe-swiftshader")
-                
-                # Set user-agent to look more like a real browser
-                edge_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.71 Safari/537.36 Edg/97.0.1072.62")
+            # Add extra options to help with detection issues
+            edge_options.add_argument("--disable-blink-features=AutomationControlled")
+            edge_options.add_argument("--disable-extensions")
+            edge_options.add_argument("--disable-gpu")
+            edge_options.add_argument("--no-sandbox")
+            
+            # Add flag to fix WebGL warnings
+            edge_options.add_argument("--enable-unsafe-swiftshader")
+            
+            # Set user-agent to look more like a real browser
+            edge_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.71 Safari/537.36 Edg/97.0.1072.62")
+            
+            try:
+                driver = webdriver.Edge(options=edge_options)
+                logger.info("Local WebDriver initialized successfully")
+            except WebDriverException as edge_error:
+                logger.error(f"Edge WebDriver failed: {edge_error}. Falling back to Chrome or Firefox.")
                 
+                # Try Chrome WebDriver
                 try:
-                    driver = webdriver.Edge(options=edge_options)
-                    logger.info("Local WebDriver initialized successfully")
-                except WebDriverException as edge_error:
-                    logger.error(f"Edge WebDriver failed: {edge_error}. Falling back to Chrome or Firefox.")
+                    chrome_options = ChromeOptions()
+                    chrome_options.add_argument("--start-maximized")
+                    chrome_options.add_argument("--disable-notifications")
+                    chrome_options.add_argument("--disable-blink-features=AutomationControlled")
+                    chrome_options.add_argument("--no-sandbox")
+                    chrome_options.add_argument("--disable-dev-shm-usage")
+                    chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.71 Safari/537.36")
                     
-                    # Try Chrome WebDriver
+                    driver = webdriver.Chrome(options=chrome_options)
+                    logger.info("Chrome WebDriver initialized successfully")
+                except WebDriverException as chrome_error:
+                    logger.error(f"Chrome WebDriver failed: {chrome_error}. Falling back to Firefox.")
+                    
+                    # Try Firefox WebDriver
                     try:
-                        chrome_options = ChromeOptions()
-                        chrome_options.add_argument("--start-maximized")
-                        chrome_options.add_argument("--disable-notifications")
-                        chrome_options.add_argument("--disable-blink-features=AutomationControlled")
-                        chrome_options.add_argument("--no-sandbox")
-                        chrome_options.add_argument("--disable-dev-shm-usage")
-                        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/97.0.4692.71 Safari/537.36")
-                        
-                        driver = webdriver.Chrome(options=chrome_options)
-                        logger.info("Chrome WebDriver initialized successfully")
-                    except WebDriverException as chrome_error:
-                        logger.error(f"Chrome WebDriver failed: {chrome_error}. Falling back to Firefox.")
+                        firefox_options = FirefoxOptions()
+                        firefox_options.add_argument("--start-maximized")
+                        firefox_options.add_argument("--disable-notifications")
+                        firefox_options.add_argument("--disable-blink-features=AutomationControlled")
+                        firefox_options.add_argument("--no-sandbox")
+                        firefox_options.add_argument("--disable-dev-shm-usage")
+                        firefox_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) Gecko/20100101 Firefox/97.0")
                         
-                        # Try Firefox WebDriver
-                        try:
-                            firefox_options = FirefoxOptions()
-                            firefox_options.add_argument("--start-maximized")
-                            firefox_options.add_argument("--disable-notifications")
-                            firefox_options.add_argument("--disable-blink-features=AutomationControlled")
-                            firefox_options.add_argument("--no-sandbox")
-                            firefox_options.add_argument("--disable-dev-shm-usage")
-                            firefox_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) Gecko/20100101 Firefox/97.0")
-                            
-                            driver = webdriver.Firefox(options=firefox_options)
-                            logger.info("Firefox WebDriver initialized successfully")
-                        except WebDriverException as firefox_error:
-                            logger.error(f"Firefox WebDriver failed: {firefox_error}. No WebDriver could be initialized.")
-                            return await generate_error_response(f"WebDriver error: {str(firefox_error)}")
-            
-            # ✅ USE INTELLIGENT LOGIN FUNCTION - NO LOOP NEEDED
-            logger.info("=== STARTING INTELLIGENT LOGIN ===")
-            login_success = log_in_v2(
-                driver=driver,
-                username=username,
-                password=password,
-                corp_id=corp_id
-            )
-            
-            if not login_success:
-                logger.error("❌ LOGIN FAILED - log_in_v2 refused login")
-                if driver:
-                    driver.quit()
-                return await generate_error_response("Login failed. Check credentials or account status.", save_json=save_json)
-            
-            logger.info("✅ LOGIN SUCCESSFUL - Proceeding to transaction extraction...")
+                        driver = webdriver.Firefox(options=firefox_options)
+                        logger.info("Firefox WebDriver initialized successfully")
+                    except WebDriverException as firefox_error:
+                        logger.error(f"Firefox WebDriver failed: {firefox_error}. No WebDriver could be initialized.")
+                        return _error_response(f"WebDriver error: {str(firefox_error)}")
+        
+        transaction_url = 'https://ebank.mbbank.com.vn/cp/account-info/transaction-inquiry'
+        # A reused session goes straight to the transactions; MB sends it back to login if it expired
+        for _ in range(2):
+            if reused_session:
+                logger.info("♻️ Reusing logged-in session, skipping login")
+            else:
+                # ✅ USE INTELLIGENT LOGIN FUNCTION - NO LOOP NEEDED
+                logger.info("=== STARTING INTELLIGENT LOGIN ===")
+                login_success = log_in_v2(
+                    driver=driver,
+                    username=username,
+                    password=password,
+                    corp_id=corp_id
+                )
+                
+                if not login_success:
+                    logger.error("❌ LOGIN FAILED - log_in_v2 refused login")
+                    return _error_response("Login failed. Check credentials or account status.", save_json=save_json)
+                
+                logger.info("✅ LOGIN SUCCESSFUL - Proceeding to transaction extraction...")
 
             # Navigate directly to the transaction inquiry page
-            transaction_url = 'https://ebank.mbbank.com.vn/cp/account-info/transaction-inquiry'
             logger.info(f"Navigating to transaction page: {transaction_url}")
             driver.get(transaction_url)
 
             # Wait for the transaction page to load
             logger.info("Waiting for transaction page to load... (3s)")
             time.sleep(3)  # Initial wait for page load
-
-            # If date parameters are provided, set the date range filters
-            if date_validation_passed:
-                # click on period_option_button
-                period_option_button = driver.find_element(By.XPATH, '//*[@id="mat-radio-3"]/label/div[1]')
-                period_option_button.click()
-                logger.info(f"Setting date range filters: from {from_date} to {to_date}")
-                try:
-                    # Locate and fill the from date input field
-                    from_date_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/form/div/div/div/div[2]/div/div/div[2]/div[1]/div[1]/div/mbb-date-time-picker/input'
-                    
-                    # Wait for the from date field to be present and clickable
-                    from_date_field = WebDriverWait(driver, 10).until(
-                        EC.element_to_be_clickable((By.XPATH, from_date_xpath))
-                    )
-                    # First click to focus, then clear, then send keys
-                    from_date_field.click()
-                    # from_date_field.clear()
-                    for _ in range(12):
-                        from_date_field.send_keys(Keys.BACKSPACE)
-                    
-                    # Add time component if not already included
-                    full_from_date = from_date
-                    if ' ' not in from_date:
-                        full_from_date = from_date + " 00:00"
-                        logger.info(f"Adding default time (00:00) to from_date: {full_from_date}")
-                    else:
-                        logger.info(f"Using provided time in from_date: {full_from_date}")
-                    
-                    from_date_field.send_keys(full_from_date)
-                    logger.info(f"Entered from_date: {full_from_date}")
-                    # accept the date
-                    # driver.find_element(By.TAG_NAME, "body").click()
-                    time.sleep(1)
-                    # Locate and fill the to date input field
-                    to_date_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/form/div/div/div/div[2]/div/div/div[2]/div[1]/div[2]/div/mbb-date-time-picker/input'
-                    
-                    # Wait for the to date field to be present and clickable
-                    to_date_field = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.XPATH, to_date_xpath))
-                    )
-                    
-                    # Make sure the to_date field is visible in the viewport
-                    driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", to_date_field)
-                    time.sleep(1)  # Wait for scroll to complete
-                    
-                    # First click more forcefully to focus on the field - try multiple approaches
-                    try:
-                        # Try standard click
-                        to_date_field.click()
-                        logger.info("Clicked to_date field with standard click")
-                    except Exception as click_error:
-                        logger.warning(f"Standard click on to_date field failed: {click_error}")
-                        try:
-                            # Try JavaScript click if standard click fails
-                            driver.execute_script("arguments[0].click();", to_date_field)
-                            logger.info("Clicked to_date field with JavaScript click")
-                        except Exception as js_click_error:
-                            logger.warning(f"JavaScript click on to_date field failed: {js_click_error}")
-                            # Try Actions chain as a last resort
-                            actions = ActionChains(driver)
-                            actions.move_to_element(to_date_field).click().perform()
-                            logger.info("Clicked to_date field with ActionChains")
-                    
-                    time.sleep(0.5)  # Short wait after click to ensure field is active
-                    
-                    # Clear the field
-                    for _ in range(12):
-                        to_date_field.send_keys(Keys.BACKSPACE)
-                    
-                    # Add time component if not already included
-                    full_to_date = to_date
-                    if ' ' not in to_date:
-                        full_to_date = to_date + " 23:59"
-                        logger.info(f"Adding default time (23:59) to to_date: {full_to_date}")
-                    else:
-                        logger.info(f"Using provided time in to_date: {full_to_date}")
-                    
-                    # Send keys with small delay between characters to ensure input is captured
-                    for char in full_to_date:
-                        to_date_field.send_keys(char)
-                        time.sleep(0.1)  # Small delay between keypresses
-                    
-                    logger.info(f"Entered to_date: {full_to_date}")
-                    # Ensure field loses focus by clicking elsewhere or pressing Tab
-                    driver.find_element(By.TAG_NAME, "body").click()
-                    time.sleep(0.5)  # Brief wait after losing focus
-                    
-                    # Click on "Truy Vấn" (Query) button - try multiple XPaths
-                    query_button_xpaths = [
-                        '//*[@id="btn-query"]',
-                        '/html/body/app-root/div/ng-component/div[1]/div/div/div[1]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/form/div/div/div/div[2]/div/div/div[3]/div/div/button',
-                        '//button[contains(text(), "Truy") and contains(text(), "Vấn")]',
-                        '//button[contains(text(), "Query")]',
-                        '//div[contains(@class, "footer")]//button'
-                    ]
-                    
-                    # Try each XPath in sequence until we find the button
-                    query_button = None
-                    for xpath in query_button_xpaths:
-                        try:
-                            logger.info(f"Looking for query button with XPath: {xpath}")
-                            potential_button = WebDriverWait(driver, 5).until(
-                                EC.presence_of_element_located((By.XPATH, xpath))
-                            )
-                            if potential_button.is_displayed():
-                                query_button = potential_button
-                                logger.info(f"Found query button with XPath: {xpath}")
-                                break
-                        except Exception as xpath_error:
-                            logger.warning(f"Query button not found with XPath {xpath}: {xpath_error}")
-                    
-                    if not query_button:
-                        # Last resort - try to find any button that might be the query button
-                        logger.info("Using fallback approach to find query button...")
-                        try:
-                            # Look for buttons in the form
-                            form_buttons = driver.find_elements(By.XPATH, "//form//button")
-                            for button in form_buttons:
-                                if button.is_displayed() and button.is_enabled():
-                                    button_text = button.text.strip().lower()
-                                    # Check if button text contains keywords that might indicate it's the query button
-                                    if any(keyword in button_text for keyword in ["truy", "vấn", "query", "search", "tìm"]):
-                                        query_button = button
-                                        logger.info(f"Found query button by text: {button.text}")
-                                        break
-                        except Exception as fallback_error:
-                            logger.error(f"Fallback query button search failed: {fallback_error}")
-                    
-                    if query_button:
-                        # Scroll to make the button visible
-                        driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", query_button)
-                        time.sleep(1)  # Wait for scroll to complete
-                        
-                        # Try multiple click methods
-                        click_success = False
-                        try:
-                            # Method 1: Direct click
-                            query_button.click()
-                            logger.info("Clicked query button directly")
-                            click_success = True
-                        except Exception as direct_click_error:
-                            logger.warning(f"Direct click on query button failed: {direct_click_error}")
-                            try:
-                                # Method 2: JavaScript click
-                                driver.execute_script("arguments[0].click();", query_button)
-                                logger.info("Clicked query button with JavaScript")
-                                click_success = True
-                            except Exception as js_click_error:
-                                logger.warning(f"JavaScript click on query button failed: {js_click_error}")
-                                try:
-                                    # Method 3: Actions chain
-                                    actions = ActionChains(driver)
-                                    actions.move_to_element(query_button).click().perform()
-                                    logger.info("Clicked query button with ActionChains")
-                                    click_success = True
-                                except Exception as actions_click_error:
-                                    logger.error(f"ActionChains click on query button failed: {actions_click_error}")
-                        if click_success:
-                            logger.info("Successfully clicked 'Truy Vấn' (Query) button")
-                            # Wait for query results to load - exactly 2 seconds as per requirement
-                            logger.info("Waiting 2 seconds for query results to load...")
-                            time.sleep(2)  # Wait exactly 2 seconds as required
-                        else:
-                            logger.error("All click methods for query button failed")
-                    else:
-                        logger.error("Could not find query button with any approach")
-                    
-                    
-                except Exception as filter_error:
-                    logger.error(f"Error setting date filters: {filter_error}")
-                    logger.warning("Continuing with default date range")
-            
             
-            # Extract account information and balance
+            if not (reused_session and "login" in driver.current_url.lower()):
+                break
+            logger.warning("Reused session has expired, logging in again")
+            reused_session = False
+
+        # If date parameters are provided, set the date range filters
+        if date_validation_passed:
+            # click on period_option_button
+            period_option_button = driver.find_element(By.XPATH, '//*[@id="mat-radio-3"]/label/div[1]')
+            period_option_button.click()
+            logger.info(f"Setting date range filters: from {from_date} to {to_date}")
             try:
-                logger.info("Extracting account information and balance data...")
-                # Define XPath expressions for balance information
-                opening_balance_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/mbb-transaction-inquiry-info/div[1]/div[1]/mbb-card-summary-amount/div/div[2]/div'
-                closing_balance_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/mbb-transaction-inquiry-info/div[1]/div[2]/mbb-card-summary-amount/div/div[2]/div'
-                total_credit_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/mbb-transaction-inquiry-info/div[1]/div[3]/mbb-card-summary-amount/div/div[2]/div'
-                total_debit_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/mbb-transaction-inquiry-info/div[1]/div[4]/mbb-card-summary-amount/div/div[2]/div'
-                
-                # Get the account balance information from the page
-                try:
-                    # Wait for each balance element and extract text
-                    opening_balance = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.XPATH, opening_balance_xpath))
-                    ).text.strip()
-                    logger.info(f"Opening balance: {opening_balance}")
-                    
-                    closing_balance = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.XPATH, closing_balance_xpath))
-                    ).text.strip()
-                    logger.info(f"Closing balance: {closing_balance}")
-                    
-                    total_credit = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.XPATH, total_credit_xpath))
-                    ).text.strip()
-                    logger.info(f"Total credit: {total_credit}")
-                    
-                    total_debit = WebDriverWait(driver, 10).until(
-                        EC.presence_of_element_located((By.XPATH, total_debit_xpath))
-                    ).text.strip()
-                    logger.info(f"Total debit: {total_debit}")
-                except TimeoutException:
-                    logger.warning("Timed out waiting for balance elements. Trying alternative approach...")
-                    # Try an alternative approach with direct find_element
-                    try:
-                        opening_balance = driver.find_element(By.XPATH, opening_balance_xpath).text.strip()
-                        closing_balance = driver.find_element(By.XPATH, closing_balance_xpath).text.strip()
-                        total_credit = driver.find_element(By.XPATH, total_credit_xpath).text.strip()
-                        total_debit = driver.find_element(By.XPATH, total_debit_xpath).text.strip()
-                        logger.info("Successfully retrieved balance information using direct approach")
-                    except NoSuchElementException:
-                        logger.error("Could not find balance elements with either approach")
-                        opening_balance = "Not available"
-                        closing_balance = "Not available"
-                        total_credit = "Not available"
-                        total_debit = "Not available"
-            except Exception as balance_error:
-                logger.error(f"Error extracting balance information: {balance_error}")
-                opening_balance = "Error"
-                closing_balance = "Error"
-                total_credit = "Error"
-                total_debit = "Error"
-            
-            # Check if we need to fetch transaction data
-            if not fetch_transactions:
-                logger.info("fetch_transactions is False - skipping transaction data extraction")
+                # Locate and fill the from date input field
+                from_date_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/form/div/div/div/div[2]/div/div/div[2]/div[1]/div[1]/div/mbb-date-time-picker/input'
                 
-                # Finalize and return the result with balance info only
-                result_data = {
-                    "timestamp": format_timestamp_gmt7(),
-                    "status": "success",
-                    "message": "Successfully retrieved balance data (transactions not requested)",
-                    "account_info": {
-                        "opening_balance": opening_balance if 'opening_balance' in locals() else "N/A",
-                        "opening_balance_json": parse_balance_field(opening_balance if 'opening_balance' in locals() else "N/A"),
-                        "closing_balance": closing_balance if 'closing_balance' in locals() else "N/A",
-                        "closing_balance_json": parse_balance_field(closing_balance if 'closing_balance' in locals() else "N/A"),
-                        "total_credit": total_credit if 'total_credit' in locals() else "N/A",
-                        "total_credit_json": parse_balance_field(total_credit if 'total_credit' in locals() else "N/A"),
-                        "total_debit": total_debit if 'total_debit' in locals() else "N/A",
-                        "total_debit_json": parse_balance_field(total_debit if 'total_debit' in locals() else "N/A"),
-                        "last_updated": format_timestamp_gmt7()
-                    },
-                    "transactions": []  # Empty list as transactions were not requested
-                }
+                # Wait for the from date field to be present and clickable
+                from_date_field = WebDriverWait(driver, 10).until(
+                    EC.element_to_be_clickable((By.XPATH, from_date_xpath))
+                )
+                # First click to focus, then clear, then send keys
+                from_date_field.click()
+                # from_date_field.clear()
+                for _ in range(12):
+                    from_date_field.send_keys(Keys.BACKSPACE)
                 
-                # Save balance-only result to JSON file if save_json is True
-                if save_json:
-                    # Use the helper function to find or create data directory
-                    data_dir = find_data_directory()
-                    
-                    json_path = os.path.join(data_dir, f"mb_biz_balance_{datetime.now().strftime('%Y%m%d_%H%M')}_success.json")
-                    with open(json_path, 'w', encoding='utf-8') as jsonfile:
-                        json.dump(result_data, jsonfile, ensure_ascii=False, indent=2)
-                    
-                    logger.info(f"Balance-only data saved to: {json_path}")
+                # Add time component if not already included
+                full_from_date = from_date
+                if ' ' not in from_date:
+                    full_from_date = from_date + " 00:00"
+                    logger.info(f"Adding default time (00:00) to from_date: {full_from_date}")
                 else:
-                    logger.info("save_json is False - not saving data to JSON file")
+                    logger.info(f"Using provided time in from_date: {full_from_date}")
+                
+                from_date_field.send_keys(full_from_date)
+                logger.info(f"Entered from_date: {full_from_date}")
+                # accept the date
+                # driver.find_element(By.TAG_NAME, "body").click()
+                time.sleep(1)
+                # Locate and fill the to date input field
+                to_date_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/form/div/div/div/div[2]/div/div/div[2]/div[1]/div[2]/div/mbb-date-time-picker/input'
                 
-                # Clean up PNG files before returning
+                # Wait for the to date field to be present and clickable
+                to_date_field = WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, to_date_xpath))
+                )
+                
+                # Make sure the to_date field is visible in the viewport
+                driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", to_date_field)
+                time.sleep(1)  # Wait for scroll to complete
+                
+                # First click more forcefully to focus on the field - try multiple approaches
                 try:
-                    logger.info("Attempting to clean up PNG files...")
-                    num_files_removed = cleanup_png_files()
-                    logger.info(f"Successfully cleaned up {num_files_removed} PNG files")
-                except Exception as cleanup_error:
-                    logger.error(f"Error during PNG cleanup: {cleanup_error}")
+                    # Try standard click
+                    to_date_field.click()
+                    logger.info("Clicked to_date field with standard click")
+                except Exception as click_error:
+                    logger.warning(f"Standard click on to_date field failed: {click_error}")
+                    try:
+                        # Try JavaScript click if standard click fails
+                        driver.execute_script("arguments[0].click();", to_date_field)
+                        logger.info("Clicked to_date field with JavaScript click")
+                    except Exception as js_click_error:
+                        logger.warning(f"JavaScript click on to_date field failed: {js_click_error}")
+                        # Try Actions chain as a last resort
+                        actions = ActionChains(driver)
+                        actions.move_to_element(to_date_field).click().perform()
+                        logger.info("Clicked to_date field with ActionChains")
                 
-                cleanup_png_files()
-                return JSONResponse(content=result_data)
-
-            # Extract transaction data from the first page
-            transactions_list = []
-            current_page = 1  # Initialize current_page here to avoid UnboundLocalError
-            try:
-                logger.info("Extracting transaction data from the first page...")
+                time.sleep(0.5)  # Short wait after click to ensure field is active
                 
-                # Get table headers
-                header_elements = driver.find_elements(By.XPATH, "//table//th")
-                headers = [header.text.strip() for header in header_elements if header.text.strip()]
-                logger.info(f"Found {len(headers)} table headers: {headers}")
+                # Clear the field
+                for _ in range(12):
+                    to_date_field.send_keys(Keys.BACKSPACE)
                 
-                # Get table rows
-                rows = driver.find_elements(By.XPATH, "//table//tbody//tr")
-                logger.info(f"Found {len(rows)} transaction rows on first page")
+                # Add time component if not already included
+                full_to_date = to_date
+                if ' ' not in to_date:
+                    full_to_date = to_date + " 23:59"
+                    logger.info(f"Adding default time (23:59) to to_date: {full_to_date}")
+                else:
+                    logger.info(f"Using provided time in to_date: {full_to_date}")
                 
-                for row in rows:
-                    cell_elements = row.find_elements(By.XPATH, "./td")
-                    row_data = [cell.text.strip() for cell in cell_elements]
-                    
-                    if row_data:  # Only add non-empty rows
-                        transaction = {}
-                        for i, header in enumerate(headers):
-                            header_key = header.strip()
-                            if i < len(row_data):
-                                transaction[header_key] = row_data[i]
-                            else:
-                                transaction[header_key] = ""
-                        
-                        transactions_list.append(transaction)
+                # Send keys with small delay between characters to ensure input is captured
+                for char in full_to_date:
+                    to_date_field.send_keys(char)
+                    time.sleep(0.1)  # Small delay between keypresses
                 
-                logger.info(f"Extracted {len(transactions_list)} transactions from first page")
-            except Exception as extract_error:
-                logger.error(f"Error extracting transaction data: {extract_error}")
-            
-            # Now handle pagination properly with more specific XPath
-            logger.info("Beginning pagination process...")
-
-            has_next_page = True
-            # Use the provided max_pages or default to a high number if null (retrieve all)
-            pages_limit = max_pages if max_pages is not None else 100
-            logger.info(f"Will retrieve up to {pages_limit} transaction pages")
-
-            # We already processed the first page above, now continue with pagination
-            while has_next_page and current_page < pages_limit:
-                logger.info(f"Currently on page {current_page}, attempting to go to next page")
+                logger.info(f"Entered to_date: {full_to_date}")
+                # Ensure field loses focus by clicking elsewhere or pressing Tab
+                driver.find_element(By.TAG_NAME, "body").click()
+                time.sleep(0.5)  # Brief wait after losing focus
                 
-                # Try to find and click the next page button with multiple approaches
-                try:
-                    # Find all button elements that might be the next button
-                    button_candidates = driver.find_elements(By.XPATH, "//button")
-                    next_button = None
-                    
-                    # Look for the button with ">" text
-                    for button in button_candidates:
-                        if button.text.strip() == ">":
-                            next_button = button
-                            logger.info("Found next button by '>' text")
+                # Click on "Truy Vấn" (Query) button - try multiple XPaths
+                query_button_xpaths = [
+                    '//*[@id="btn-query"]',
+                    '/html/body/app-root/div/ng-component/div[1]/div/div/div[1]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/form/div/div/div/div[2]/div/div/div[3]/div/div/button',
+                    '//button[contains(text(), "Truy") and contains(text(), "Vấn")]',
+                    '//button[contains(text(), "Query")]',
+                    '//div[contains(@class, "footer")]//button'
+                ]
+                
+                # Try each XPath in sequence until we find the button
+                query_button = None
+                for xpath in query_button_xpaths:
+                    try:
+                        logger.info(f"Looking for query button with XPath: {xpath}")
+                        potential_button = WebDriverWait(driver, 5).until(
+                            EC.presence_of_element_located((By.XPATH, xpath))
+                        )
+                        if potential_button.is_displayed():
+                            query_button = potential_button
+                            logger.info(f"Found query button with XPath: {xpath}")
                             break
-                    
-                    # If not found by text, try by position in pagination container
-                    if not next_button:
-                        logger.info("Trying to find next button in pagination container...")
-                        try:
-                            pagination_container = driver.find_element(By.XPATH, '//*[@id="page-items"]')
-                            pagination_buttons = pagination_container.find_elements(By.TAG_NAME, "button")
-                            
-                            # Look for ">" button in pagination container
-                            for btn in pagination_buttons:
-                                if btn.text.strip() == ">":
-                                    next_button = btn
-                                    logger.info("Found next button in pagination container")
+                    except Exception as xpath_error:
+                        logger.warning(f"Query button not found with XPath {xpath}: {xpath_error}")
+                
+                if not query_button:
+                    # Last resort - try to find any button that might be the query button
+                    logger.info("Using fallback approach to find query button...")
+                    try:
+                        # Look for buttons in the form
+                        form_buttons = driver.find_elements(By.XPATH, "//form//button")
+                        for button in form_buttons:
+                            if button.is_displayed() and button.is_enabled():
+                                button_text = button.text.strip().lower()
+                                # Check if button text contains keywords that might indicate it's the query button
+                                if any(keyword in button_text for keyword in ["truy", "vấn", "query", "search", "tìm"]):
+                                    query_button = button
+                                    logger.info(f"Found query button by text: {button.text}")
                                     break
-                        except Exception as e:
-                            logger.warning(f"Couldn't find pagination container: {e}")
+                    except Exception as fallback_error:
+                        logger.error(f"Fallback query button search failed: {fallback_error}")
+                
+                if query_button:
+                    # Scroll to make the button visible
+                    driver.execute_script("arguments[0].scrollIntoView({behavior: 'smooth', block: 'center'});", query_button)
+                    time.sleep(1)  # Wait for scroll to complete
                     
-                    if next_button:
-                        # Check if the button is actually enabled by examining its attributes and appearance
-                        is_disabled = False
+                    # Try multiple click methods
+                    click_success = False
+                    try:
+                        # Method 1: Direct click
+                        query_button.click()
+                        logger.info("Clicked query button directly")
+                        click_success = True
+                    except Exception as direct_click_error:
+                        logger.warning(f"Direct click on query button failed: {direct_click_error}")
                         try:
-                            disabled_attr = next_button.get_attribute("disabled")
-                            aria_disabled = next_button.get_attribute("aria-disabled")
-                            btn_class = next_button.get_attribute("class")
-                            
-                            logger.info(f"Next button disabled attribute: {disabled_attr}")
-                            logger.info(f"Next button aria-disabled: {aria_disabled}")
-                            logger.info(f"Next button class: {btn_class}")
-                            
-                            is_disabled = (
-                                disabled_attr == "true" or 
-                                disabled_attr == "" or 
-                                aria_disabled == "true" or 
-                                (btn_class and "disabled" in btn_class)
-                            )
-                        except Exception as e:
-                            logger.warning(f"Error checking button disabled state: {e}")
-                        
-                        if is_disabled:
-                            logger.info("Next button is disabled - reached the end of pagination")
-                            has_next_page = False
-                        else:
-                            # The button is enabled, try to click it
+                            # Method 2: JavaScript click
+                            driver.execute_script("arguments[0].click();", query_button)
+                            logger.info("Clicked query button with JavaScript")
+                            click_success = True
+                        except Exception as js_click_error:
+                            logger.warning(f"JavaScript click on query button failed: {js_click_error}")
                             try:
-                                # Scroll to make the button visible
-                                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_button)
-                                time.sleep(1)
-                                
-                                # Check if it's visible before clicking
-                                if next_button.is_displayed():
-                                    logger.info("Next button is displayed and enabled, clicking...")
-                                    
-                                    # Try direct click first
-                                    try:
-                                        next_button.click()
-                                        logger.info("Successfully clicked next button directly")
-                                        click_success = True
-                                    except Exception as click_error:
-                                        logger.warning(f"Direct click failed: {click_error}")
-                                        
-                                        # Try JavaScript click as fallback
-                                        try:
-                                            driver.execute_script("arguments[0].click();", next_button)
-                                            logger.info("Successfully clicked next button with JavaScript")
-                                            click_success = True
-                                        except Exception as js_error:
-                                            logger.error(f"JavaScript click also failed: {js_error}")
-                                            click_success = False
-                                    
-                                    # Wait for page to load after successful click
-                                    if click_success:
-                                        logger.info("Waiting for next page to load...")
-                                        time.sleep(3)
-                                        current_page += 1
-                                        
-                                        # Extract transactions from the new page
-                                        logger.info(f"Extracting transaction data from page {current_page}...")
-                                        new_rows = driver.find_elements(By.XPATH, "//table//tbody//tr")
-                                        
-                                        if new_rows:
-                                            logger.info(f"Found {len(new_rows)} additional transactions on page {current_page}")
-                                            
-                                            # Re-fetch headers to ensure consistency
-                                            header_elements = driver.find_elements(By.XPATH, "//table//th")
-                                            headers = [header.text.strip() for header in header_elements if header.text.strip()]
-                                            
-                                            for row in new_rows:
-                                                cell_elements = row.find_elements(By.XPATH, "./td")
-                                                row_data = [cell.text.strip() for cell in cell_elements]
-                                                
-                                                if row_data:  # Only add non-empty rows
-                                                    transaction = {}
-                                                    for i, header in enumerate(headers):
-                                                        header_key = header.strip()
-                                                        if i < len(row_data):
-                                                            transaction[header_key] = row_data[i]
-                                                        else:
-                                                            transaction[header_key] = ""
-                                                    
-                                                    transactions_list.append(transaction)
-                                            
-
-                                            logger.info(f"Total transactions collected so far: {len(transactions_list)}")
-                                        else:
-                                            logger.warning(f"No transaction rows found on page {current_page}")
-                                            has_next_page = False
-                                    else:
-                                        logger.error("All click methods failed - cannot navigate to next page")
-                                        has_next_page = False
-                            except Exception as visibility_error:
-                                logger.error(f"Error checking button visibility: {visibility_error}")
-                                has_next_page = False
+                                # Method 3: Actions chain
+                                actions = ActionChains(driver)
+                                actions.move_to_element(query_button).click().perform()
+                                logger.info("Clicked query button with ActionChains")
+                                click_success = True
+                            except Exception as actions_click_error:
+                                logger.error(f"ActionChains click on query button failed: {actions_click_error}")
+                    if click_success:
+                        logger.info("Successfully clicked 'Truy Vấn' (Query) button")
+                        # Wait for query results to load - exactly 2 seconds as per requirement
+                        logger.info("Waiting 2 seconds for query results to load...")
+                        time.sleep(2)  # Wait exactly 2 seconds as required
                     else:
-                        logger.warning("Next page button not found - reached the end of pagination")
-                        has_next_page = False
-                except Exception as pagination_error:
-                    logger.error(f"Error during pagination: {pagination_error}")
-                    has_next_page = False
+                        logger.error("All click methods for query button failed")
+                else:
+                    logger.error("Could not find query button with any approach")
+                
+                
+            except Exception as filter_error:
+                logger.error(f"Error setting date filters: {filter_error}")
+                logger.warning("Continuing with default date range")
+        
+        
+        # Extract account information and balance
+        try:
+            logger.info("Extracting account information and balance data...")
+            # Define XPath expressions for balance information
+            opening_balance_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/mbb-transaction-inquiry-info/div[1]/div[1]/mbb-card-summary-amount/div/div[2]/div'
+            closing_balance_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/mbb-transaction-inquiry-info/div[1]/div[2]/mbb-card-summary-amount/div/div[2]/div'
+            total_credit_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/mbb-transaction-inquiry-info/div[1]/div[3]/mbb-card-summary-amount/div/div[2]/div'
+            total_debit_xpath = '//*[@id="scroll-content"]/div/div/div/mbb-account-info/mbb-transaction-inquiry-v2/mbb-transaction-inquiry-info/div[1]/div[4]/mbb-card-summary-amount/div/div[2]/div'
             
-            logger.info(f"Pagination complete. Processed {current_page} pages with {len(transactions_list)} total transactions.")
-
-            # Filter and clean transactions before returning the result
-            transactions_list = [
-                clean_transaction_fields(transaction)
-                for transaction in transactions_list
-                if is_valid_transaction(transaction)
-            ]
-
-            logger.info(f"Filtered and cleaned transactions: {len(transactions_list)} valid transactions remain.")
+            # Get the account balance information from the page
+            try:
+                # Wait for each balance element and extract text
+                opening_balance = WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, opening_balance_xpath))
+                ).text.strip()
+                logger.info(f"Opening balance: {opening_balance}")
+                
+                closing_balance = WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, closing_balance_xpath))
+                ).text.strip()
+                logger.info(f"Closing balance: {closing_balance}")
+                
+                total_credit = WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, total_credit_xpath))
+                ).text.strip()
+                logger.info(f"Total credit: {total_credit}")
+                
+                total_debit = WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.XPATH, total_debit_xpath))
+                ).text.strip()
+                logger.info(f"Total debit: {total_debit}")
+            except TimeoutException:
+                logger.warning("Timed out waiting for balance elements. Trying alternative approach...")
+                # Try an alternative approach with direct find_element
+                try:
+                    opening_balance = driver.find_element(By.XPATH, opening_balance_xpath).text.strip()
+                    closing_balance = driver.find_element(By.XPATH, closing_balance_xpath).text.strip()
+                    total_credit = driver.find_element(By.XPATH, total_credit_xpath).text.strip()
+                    total_debit = driver.find_element(By.XPATH, total_debit_xpath).text.strip()
+                    logger.info("Successfully retrieved balance information using direct approach")
+                except NoSuchElementException:
+                    logger.error("Could not find balance elements with either approach")
+                    opening_balance = "Not available"
+                    closing_balance = "Not available"
+                    total_credit = "Not available"
+                    total_debit = "Not available"
+        except Exception as balance_error:
+            logger.error(f"Error extracting balance information: {balance_error}")
+            opening_balance = "Error"
+            closing_balance = "Error"
+            total_credit = "Error"
+            total_debit = "Error"
+        
+        # Check if we need to fetch transaction data
+        if not fetch_transactions:
+            logger.info("fetch_transactions is False - skipping transaction data extraction")
             
-            # Finalize and return the result
+            # Finalize and return the result with balance info only
             result_data = {
                 "timestamp": format_timestamp_gmt7(),
                 "status": "success",
-                "message": f"Successfully retrieved transaction data from {from_date or 'latest page'} to {format_timestamp_gmt7() or 'now'}",
+                "message": "Successfully retrieved balance data (transactions not requested)",
                 "account_info": {
                     "opening_balance": opening_balance if 'opening_balance' in locals() else "N/A",
                     "opening_balance_json": parse_balance_field(opening_balance if 'opening_balance' in locals() else "N/A"),
@@ -1182,37 +1080,276 @@ async def mb_biz_login_v2(
                     "total_debit_json": parse_balance_field(total_debit if 'total_debit' in locals() else "N/A"),
                     "last_updated": format_timestamp_gmt7()
                 },
-                "transactions": transactions_list if 'transactions_list' in locals() and transactions_list is not None else []
+                "transactions": []  # Empty list as transactions were not requested
             }
             
-            # Save successful result to JSON file if save_json is True
+            # Save balance-only result to JSON file if save_json is True
             if save_json:
                 # Use the helper function to find or create data directory
                 data_dir = find_data_directory()
                 
-                json_path = os.path.join(data_dir, f"mb_biz_transactions_{datetime.now().strftime('%Y%m%d_%H%M')}_success.json")
+                json_path = os.path.join(data_dir, f"mb_biz_balance_{datetime.now().strftime('%Y%m%d_%H%M')}_success.json")
                 with open(json_path, 'w', encoding='utf-8') as jsonfile:
                     json.dump(result_data, jsonfile, ensure_ascii=False, indent=2)
                 
-                logger.info(f"Successful transaction data saved to: {json_path}")
+                logger.info(f"Balance-only data saved to: {json_path}")
             else:
                 logger.info("save_json is False - not saving data to JSON file")
             
+            # Clean up PNG files before returning
+            try:
+                logger.info("Attempting to clean up PNG files...")
+                num_files_removed = cleanup_png_files()
+                logger.info(f"Successfully cleaned up {num_files_removed} PNG files")
+            except Exception as cleanup_error:
+                logger.error(f"Error during PNG cleanup: {cleanup_error}")
+            
             cleanup_png_files()
             return JSONResponse(content=result_data)
+
+        # Extract transaction data from the first page
+        transactions_list = []
+        current_page = 1  # Initialize current_page here to avoid UnboundLocalError
+        try:
+            logger.info("Extracting transaction data from the first page...")
             
-        except Exception as driver_error:
-            logger.error(f"Error during web scraping: {driver_error}", exc_info=True)
-            if driver:
-                driver.quit()
-            return await generate_error_response(f"WebDriver error: {str(driver_error)}", save_json=save_json)
+            # Get table headers
+            header_elements = driver.find_elements(By.XPATH, "//table//th")
+            headers = [header.text.strip() for header in header_elements if header.text.strip()]
+            logger.info(f"Found {len(headers)} table headers: {headers}")
             
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}", exc_info=True)
-        return await generate_error_response(f"An unexpected error occurred: {str(e)}", save_json=save_json)
-    
+            # Get table rows
+            rows = driver.find_elements(By.XPATH, "//table//tbody//tr")
+            logger.info(f"Found {len(rows)} transaction rows on first page")
+            
+            for row in rows:
+                cell_elements = row.find_elements(By.XPATH, "./td")
+                row_data = [cell.text.strip() for cell in cell_elements]
+                
+                if row_data:  # Only add non-empty rows
+                    transaction = {}
+                    for i, header in enumerate(headers):
+                        header_key = header.strip()
+                        if i < len(row_data):
+                            transaction[header_key] = row_data[i]
+                        else:
+                            transaction[header_key] = ""
+                    
+                    transactions_list.append(transaction)
+            
+            logger.info(f"Extracted {len(transactions_list)} transactions from first page")
+        except Exception as extract_error:
+            logger.error(f"Error extracting transaction data: {extract_error}")
+        
+        # Now handle pagination properly with more specific XPath
+        logger.info("Beginning pagination process...")
+
+        has_next_page = True
+        # Use the provided max_pages or default to a high number if null (retrieve all)
+        pages_limit = max_pages if max_pages is not None else 100
+        logger.info(f"Will retrieve up to {pages_limit} transaction pages")
+
+        # We already processed the first page above, now continue with pagination
+        while has_next_page and current_page < pages_limit:
+            logger.info(f"Currently on page {current_page}, attempting to go to next page")
+            
+            # Try to find and click the next page button with multiple approaches
+            try:
+                # Find all button elements that might be the next button
+                button_candidates = driver.find_elements(By.XPATH, "//button")
+                next_button = None
+                
+                # Look for the button with ">" text
+                for button in button_candidates:
+                    if button.text.strip() == ">":
+                        next_button = button
+                        logger.info("Found next button by '>' text")
+                        break
+                
+                # If not found by text, try by position in pagination container
+                if not next_button:
+                    logger.info("Trying to find next button in pagination container...")
+                    try:
+                        pagination_container = driver.find_element(By.XPATH, '//*[@id="page-items"]')
+                        pagination_buttons = pagination_container.find_elements(By.TAG_NAME, "button")
+                        
+                        # Look for ">" button in pagination container
+                        for btn in pagination_buttons:
+                            if btn.text.strip() == ">":
+                                next_button = btn
+                                logger.info("Found next button in pagination container")
+                                break
+                    except Exception as e:
+                        logger.warning(f"Couldn't find pagination container: {e}")
+                
+                if next_button:
+                    # Check if the button is actually enabled by examining its attributes and appearance
+                    is_disabled = False
+                    try:
+                        disabled_attr = next_button.get_attribute("disabled")
+                        aria_disabled = next_button.get_attribute("aria-disabled")
+                        btn_class = next_button.get_attribute("class")
+                        
+                        logger.info(f"Next button disabled attribute: {disabled_attr}")
+                        logger.info(f"Next button aria-disabled: {aria_disabled}")
+                        logger.info(f"Next button class: {btn_class}")
+                        
+                        is_disabled = (
+                            disabled_attr == "true" or 
+                            disabled_attr == "" or 
+                            aria_disabled == "true" or 
+                            (btn_class and "disabled" in btn_class)
+                        )
+                    except Exception as e:
+                        logger.warning(f"Error checking button disabled state: {e}")
+                    
+                    if is_disabled:
+                        logger.info("Next button is disabled - reached the end of pagination")
+                        has_next_page = False
+                    else:
+                        # The button is enabled, try to click it
+                        try:
+                            # Scroll to make the button visible
+                            driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", next_button)
+                            time.sleep(1)
+                            
+                            # Check if it's visible before clicking
+                            if next_button.is_displayed():
+                                logger.info("Next button is displayed and enabled, clicking...")
+                                
+                                # Try direct click first
+                                try:
+                                    next_button.click()
+                                    logger.info("Successfully clicked next button directly")
+                                    click_success = True
+                                except Exception as click_error:
+                                    logger.warning(f"Direct click failed: {click_error}")
+                                    
+                                    # Try JavaScript click as fallback
+                                    try:
+                                        driver.execute_script("arguments[0].click();", next_button)
+                                        logger.info("Successfully clicked next button with JavaScript")
+                                        click_success = True
+                                    except Exception as js_error:
+                                        logger.error(f"JavaScript click also failed: {js_error}")
+                                        click_success = False
+                                
+                                # Wait for page to load after successful click
+                                if click_success:
+                                    logger.info("Waiting for next page to load...")
+                                    time.sleep(3)
+                                    current_page += 1
+                                    
+                                    # Extract transactions from the new page
+                                    logger.info(f"Extracting transaction data from page {current_page}...")
+                                    new_rows = driver.find_elements(By.XPATH, "//table//tbody//tr")
+                                    
+                                    if new_rows:
+                                        logger.info(f"Found {len(new_rows)} additional transactions on page {current_page}")
+                                        
+                                        # Re-fetch headers to ensure consistency
+                                        header_elements = driver.find_elements(By.XPATH, "//table//th")
+                                        headers = [header.text.strip() for header in header_elements if header.text.strip()]
+                                        
+                                        for row in new_rows:
+                                            cell_elements = row.find_elements(By.XPATH, "./td")
+                                            row_data = [cell.text.strip() for cell in cell_elements]
+                                            
+                                            if row_data:  # Only add non-empty rows
+                                                transaction = {}
+                                                for i, header in enumerate(headers):
+                                                    header_key = header.strip()
+                                                    if i < len(row_data):
+                                                        transaction[header_key] = row_data[i]
+                                                    else:
+                                                        transaction[header_key] = ""
+                                                
+                                                transactions_list.append(transaction)
+                                        
+
+                                        logger.info(f"Total transactions collected so far: {len(transactions_list)}")
+                                    else:
+                                        logger.warning(f"No transaction rows found on page {current_page}")
+                                        has_next_page = False
+                                else:
+                                    logger.error("All click methods failed - cannot navigate to next page")
+                                    has_next_page = False
+                        except Exception as visibility_error:
+                            logger.error(f"Error checking button visibility: {visibility_error}")
+                            has_next_page = False
+                else:
+                    logger.warning("Next page button not found - reached the end of pagination")
+                    has_next_page = False
+            except Exception as pagination_error:
+                logger.error(f"Error during pagination: {pagination_error}")
+                has_next_page = False
+        
+        logger.info(f"Pagination complete. Processed {current_page} pages with {len(transactions_list)} total transactions.")
+
+        # Filter and clean transactions before returning the result
+        transactions_list = [
+            clean_transaction_fields(transaction)
+            for transaction in transactions_list
+            if is_valid_transaction(transaction)
+        ]
+
+        logger.info(f"Filtered and cleaned transactions: {len(transactions_list)} valid transactions remain.")
+        
+        # Finalize and return the result
+        result_data = {
+            "timestamp": format_timestamp_gmt7(),
+            "status": "success",
+            "message": f"Successfully retrieved transaction data from {from_date or 'latest page'} to {format_timestamp_gmt7() or 'now'}",
+            "account_info": {
+                "opening_balance": opening_balance if 'opening_balance' in locals() else "N/A",
+                "opening_balance_json": parse_balance_field(opening_balance if 'opening_balance' in locals() else "N/A"),
+                "closing_balance": closing_balance if 'closing_balance' in locals() else "N/A",
+                "closing_balance_json": parse_balance_field(closing_balance if 'closing_balance' in locals() else "N/A"),
+                "total_credit": total_credit if 'total_credit' in locals() else "N/A",
+                "total_credit_json": parse_balance_field(total_credit if 'total_credit' in locals() else "N/A"),
+                "total_debit": total_debit if 'total_debit' in locals() else "N/A",
+                "total_debit_json": parse_balance_field(total_debit if 'total_debit' in locals() else "N/A"),
+                "last_updated": format_timestamp_gmt7()
+            },
+            "transactions": transactions_list if 'transactions_list' in locals() and transactions_list is not None else []
+        }
+        
+        # Save successful result to JSON file if save_json is True
+        if save_json:
+            # Use the helper function to find or create data directory
+            data_dir = find_data_directory()
+            
+            json_path = os.path.join(data_dir, f"mb_biz_transactions_{datetime.now().strftime('%Y%m%d_%H%M')}_success.json")
+            with open(json_path, 'w', encoding='utf-8') as jsonfile:
+                json.dump(result_data, jsonfile, ensure_ascii=False, indent=2)
+            
+            logger.info(f"Successful transaction data saved to: {json_path}")
+        else:
+            logger.info("save_json is False - not saving data to JSON file")
+        
+        cleanup_png_files()
+        return JSONResponse(content=result_data)
+        
+    except Exception as driver_error:
+        logger.error(f"Error during web scraping: {driver_error}", exc_info=True)
+        return _error_response(f"WebDriver error: {str(driver_error)}", save_json=save_json)
+    finally:
+        # Pooled sessions are parked (still logged in) or handed back, local browsers are closed
+        if driver is not None:
+            try:
+                if use_selenium_grid:
+                    _release_biz_session(pool, account, driver)
+                else:
+                    driver.quit()
+            except Exception as release_error:
+                logger.error(f"Error releasing WebDriver: {release_error}")
+
 async def generate_error_response(message: str, status_code: int = 500, save_json: bool = False) -> JSONResponse:
     """Generate a standardized error response"""
+    return _error_response(message, status_code, save_json)
+
+def _error_response(message: str, status_code: int = 500, save_json: bool = False) -> JSONResponse:
+    """Standardized error response, for sync code (the crawl thread)"""
     result_data = {
         "timestamp": format_timestamp_gmt7(),
         "status": "false",  # Changed from "error" to "false" as requested
@@ -1256,6 +1393,5 @@ async def generate_error_response(message: str, status_code: int = 500, save_jso
 
 def format_timestamp_gmt7():
     """Format current timestamp in GMT+7 timezone with format dd-mm-yyyy hh:mm:ss"""
-    vietnam_tz = pytz.timezone('Asia/Ho_Chi_Minh')
-    current_time = datetime.now(vietnam_tz)
+    current_time = datetime.now(_GMT7)
     return current_time.strftime('%d-%m-%Y %H:%M:%S')
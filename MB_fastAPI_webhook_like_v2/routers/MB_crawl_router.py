@@ -9,9 +9,7 @@ from datetime import datetime, timedelta
 import pytz  # Added import for timezone support
 import asyncio
 import random
-import socket
 from typing import Optional, Dict, Any
-import httpx
 
 # Import Selenium components
 from selenium import webdriver
@@ -24,7 +22,7 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 from routers.captcha_reading import read_captcha
 
-from fastapi import APIRouter, HTTPException, Query, Body
+from fastapi import APIRouter, HTTPException, Query, Body, Request
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
@@ -66,8 +64,23 @@ def get_selenium_hub_url():
     port = os.environ.get("SELENIUM_PORT", "4445")  # The mapped port in docker-compose.yml
     return f"http://{docker_host}:{port}/wd/hub"
 
+async def test_selenium_hub_connection(client, selenium_grid_url):
+    """Check the grid's /status through a shared keep-alive client, instead of a new connection per probe"""
+    grid_status_url = selenium_grid_url.rsplit("/wd/hub", 1)[0] + "/status"
+    try:
+        logger.info(f"Checking Selenium Grid status: {grid_status_url}")
+        response = await client.get(grid_status_url, timeout=2.0)
+        if response.status_code == 200:
+            logger.info("Selenium Grid is available (status check)")
+            return True
+        logger.warning(f"Selenium Grid returned status code: {response.status_code}")
+    except Exception as e:
+        logger.error(f"Could not connect to Selenium Grid: {e}")
+    return False
+
 @router.get('/MB_transaction_crawling', tags=['MB'])
 async def mb_login(
+    request: Request,
     username: str = Query(..., description="MB username"),
     password: str = Query(..., description="MB password"),
     max_retries: int = Query(3, description="Maximum number of retries for captcha reading"),
@@ -88,42 +101,15 @@ async def mb_login(
             
             # Initialize WebDriver (grid or local)
             if use_selenium_grid:
-                # Try to resolve selenium-hub first to check if it's accessible
+                # Check the hub answers before asking it for a session
                 try:
                     selenium_grid_url = get_selenium_hub_url()
                     logger.info(f"Attempting to connect to Selenium Grid at: {selenium_grid_url}")
                     
-                    # Test connection to Selenium Grid
-                    # If running locally, we'll use httpx to check if the service is up
-                    grid_host = selenium_grid_url.split("//")[1].split(":")[0]
-                    grid_port = int(selenium_grid_url.split(":")[-1].split("/")[0])
-                    
-                    if grid_host == "selenium-hub":
-                        # We're likely in Docker, so try to resolve the hostname
-                        try:
-                            socket.gethostbyname(grid_host)
-                            logger.info(f"Successfully resolved hostname: {grid_host}")
-                        except socket.gaierror:
-                            logger.error(f"Could not resolve hostname: {grid_host}")
-                            logger.info("Falling back to local WebDriver")
-                            use_selenium_grid = False
-                    else:
-                        # Try to connect to the Grid via httpx
-                        try:
-                            async with httpx.AsyncClient(timeout=5.0) as client:
-                                grid_status_url = f"http://{grid_host}:{grid_port}/status"
-                                logger.info(f"Checking Selenium Grid status: {grid_status_url}")
-                                response = await client.get(grid_status_url)
-                                if response.status_code == 200:
-                                    logger.info("Selenium Grid is available")
-                                else:
-                                    logger.warning(f"Selenium Grid returned status code: {response.status_code}")
-                                    logger.info("Falling back to local WebDriver")
-                                    use_selenium_grid = False
-                        except Exception as e:
-                            logger.error(f"Could not connect to Selenium Grid: {e}")
-                            logger.info("Falling back to local WebDriver")
-                            use_selenium_grid = False
+                    # One GET /status over the app's shared HTTP client
+                    if not await test_selenium_hub_connection(request.app.state.http_client, selenium_grid_url):
+                        logger.info("Falling back to local WebDriver")
+                        use_selenium_grid = False
                     
                     if use_selenium_grid:
                         options = webdriver.EdgeOptions()
@@ -71,6 +71,7 @@ def preprocess_image(image_source, is_bytes=False, save_image=True):
 def read_captcha(image_source, is_bytes=False, save_images=True):
     """
     Read captcha by preprocessing the image and applying OCR
+    Returns the text with spaces already removed ("" if nothing was read)
     """
     try:
         # Get processed image (grayscale with non-black pixels made white)
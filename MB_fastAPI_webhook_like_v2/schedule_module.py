@@ -78,8 +78,8 @@ logger.info(f"🌏 Formatted: {test_time.strftime('%d/%m/%Y %H:%M:%S')}")
 # Handle Docker stop (SIGTERM) or Ctrl+C (SIGINT)
 def stop_gracefully(sig, frame):
     logger.info("Shutting down gracefully...")
-    if webdriver_instance:
-        driver.close_driver()
+    # Quit every pooled session, not only the one we hold, so the grid gets its slots back
+    driver.close_driver()
     sys.exit(0)
 
 signal.signal(signal.SIGINT, stop_gracefully)